@@ -1,16 +1,19 @@
 import streamlit as st
-import base64
-from PIL import Image
-import numpy as np
 import os
 import sys
+import time
+import uuid
+from concurrent.futures import CancelledError, TimeoutError
 
 # Add utils to path
 sys.path.append('utils')
 
-from utils.emoji_matcher import EmojiMatcher
 from utils.drawing_canvas import DrawingCanvas, render_drawing_controls
-from utils.image_processor import ImageProcessor
+from utils.analysis_cache import AnalysisCache, canvas_fingerprint
+from utils.analysis_pool import analyze_frame
+from utils.metrics import env_flag, get_metrics, profile_call, timed
+from utils.shared_resources import get_shared_resources
+from utils.stroke_features import StrokeFeatureExtractor
 
 # Page configuration
 st.set_page_config(
@@ -21,19 +24,62 @@ st.set_page_config(
 )
 
 
+# How long a rerun waits for off-thread analysis before showing the last result
+ANALYSIS_WAIT_SECONDS = 0.25
+
+# Pause before rerunning to pick up analysis that missed that wait, and
+# before resubmitting a frame the saturated pool rejected
+ANALYSIS_POLL_SECONDS = 0.1
+ANALYSIS_RETRY_SECONDS = 1.0
+
+# Search results shown per page
+SEARCH_PAGE_SIZE = 18
+
+
 # Load custom CSS
 def load_css():
     with open("assets/styles.css") as f:
         st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
 
+QUICK_EXAMPLES = [
+    "Happy face with smile",
+    "Cat with whiskers",
+    "Heart shape",
+    "Pizza slice",
+    "Sun with rays",
+    "Tree with leaves"
+]
+
+POPULAR_SEARCHES = ["love", "happy", "animal", "food", "celebration", "travel"]
+
+
 class DrawingToEmojiApp:
+    @timed('app.init')
     def __init__(self):
-        self.emoji_matcher = EmojiMatcher()
+        # Matcher and processor are shared across sessions and reruns
+        shared = get_shared_resources()
+        self.emoji_matcher = shared.get_emoji_matcher()
+        self.result_renderer = shared.get_result_renderer()
+        # Database edits are picked up in the background, without a restart
+        shared.start_watcher()
+        # Repeated queries are answered from a process-wide cache, seeded
+        # with the sidebar examples once per database version
+        self.query_cache = shared.get_query_cache()
+        self.query_cache.prewarm(self.emoji_matcher, QUICK_EXAMPLES, top_k=8,
+                                 searches=POPULAR_SEARCHES, search_limit=18)
         self.drawing_canvas = DrawingCanvas()
-        self.image_processor = ImageProcessor()
+        self.analysis_pool = shared.get_analysis_pool()
+        # Set when this rerun leaves canvas analysis outstanding
+        self.analysis_poll_delay = None
         load_css()
 
+    @property
+    def image_processor(self):
+        # Resolved on first use so OpenCV loads only once someone draws
+        return get_shared_resources().get_image_processor()
+
+    @timed('app.sidebar')
     def render_sidebar(self):
         """Render the sidebar with controls and information"""
         st.sidebar.title("🎨 Draw to Emoji")
@@ -53,22 +99,164 @@ class DrawingToEmojiApp:
 
         st.sidebar.markdown("---")
         st.sidebar.header("🎯 Quick Examples")
-        examples = [
-            "Happy face with smile",
-            "Cat with whiskers",
-            "Heart shape",
-            "Pizza slice",
-            "Sun with rays",
-            "Tree with leaves"
-        ]
-
-        for example in examples:
+        for example in QUICK_EXAMPLES:
             if st.sidebar.button(f"✨ {example}", key=f"ex_{example}"):
                 st.session_state.text_input = example
                 st.rerun()
 
+        st.sidebar.markdown("---")
+        with st.sidebar.expander("⚙️ Engine Stats"):
+            stats = get_shared_resources().get_stats()
+            st.markdown(f"**Matcher builds:** {stats['matcher_builds']}")
+            st.markdown(f"**Last build time:** {stats['last_build_seconds'] * 1000:.1f} ms")
+            st.markdown(f"**Total build time:** {stats['matcher_build_seconds'] * 1000:.1f} ms")
+            st.markdown(f"**Shared matcher reuses:** {stats['matcher_hits']}")
+            query_stats = self.query_cache.get_stats()
+            st.markdown(f"**Query cache:** {query_stats['hit_rate']:.0%} hit rate "
+                        f"({query_stats['hits']} hits / {query_stats['misses']} misses, "
+                        f"{query_stats['size']} entries)")
+            st.markdown(f"**Database version:** {self.emoji_matcher.version} "
+                        f"({stats['matcher_updates']} live updates, last "
+                        f"{stats['last_update_seconds'] * 1000:.1f} ms)")
+            cache_stats = self.get_analysis_cache().get_stats()
+            st.markdown(f"**Canvas analysis cache:** {cache_stats['hits']} hits / "
+                        f"{cache_stats['misses']} misses")
+            pool_stats = self.analysis_pool.get_stats()
+            st.markdown(f"**Analysis pool:** {pool_stats['workers']} {pool_stats['kind']} workers, "
+                        f"{pool_stats['queue_depth']} queued, {pool_stats['cancelled']} superseded")
+            if 'latency_p50' in pool_stats:
+                st.markdown(f"**Analysis latency:** p50 {pool_stats['latency_p50'] * 1000:.1f} ms / "
+                            f"p95 {pool_stats['latency_p95'] * 1000:.1f} ms")
+
+        self.render_metrics_panel()
+
         return drawing_settings
 
+    def render_metrics_panel(self):
+        """Render the stage timing panel, shown only with EMOJI_METRICS_PANEL=1.
+
+        Its controls change process-wide state for every session and write
+        files on the server, so visitors cannot turn it on themselves.
+        """
+        if not env_flag('EMOJI_METRICS_PANEL'):
+            return
+
+        metrics = get_metrics()
+        with st.sidebar.expander("🩺 Performance"):
+            # The registry is per process, so this affects every session; only
+            # an actual toggle changes it, not every rerun of this session
+            st.checkbox("Collect stage timings", value=metrics.enabled, key='collect_stage_timings',
+                        on_change=lambda: metrics.set_enabled(st.session_state.collect_stage_timings))
+
+            summary = metrics.summary()
+            if summary:
+                st.table([{
+                    'stage': stage,
+                    'calls': stats['count'],
+                    'mean ms': f"{stats['mean'] * 1000:.2f}",
+                    'p50 ms': f"{stats['p50'] * 1000:.2f}",
+                    'p95 ms': f"{stats['p95'] * 1000:.2f}",
+                    'p99 ms': f"{stats['p99'] * 1000:.2f}",
+                } for stage, stats in summary.items()])
+            else:
+                st.caption("No timings recorded yet.")
+
+            export_path = os.environ.get('EMOJI_METRICS_FILE', 'metrics.prom')
+            if st.button("📤 Export Prometheus metrics"):
+                metrics.write_prometheus(export_path)
+                st.success(f"Wrote {export_path}")
+            if st.button("♻️ Reset timings"):
+                metrics.reset()
+            if st.button("🧪 Profile next rerun"):
+                st.session_state.profile_next_rerun = True
+
+    @staticmethod
+    def get_analysis_cache():
+        """Return this session's canvas analysis cache"""
+        if 'analysis_cache' not in st.session_state:
+            st.session_state.analysis_cache = AnalysisCache(maxsize=16)
+        return st.session_state.analysis_cache
+
+    def get_stroke_extractor(self):
+        """Return this session's incremental stroke feature extractor"""
+        if 'stroke_extractor' not in st.session_state:
+            st.session_state.stroke_extractor = StrokeFeatureExtractor(
+                self.drawing_canvas.width, self.drawing_canvas.height)
+        return st.session_state.stroke_extractor
+
+    @timed('app.analyze_canvas')
+    def analyze_canvas(self, image_data, json_data=None):
+        """Analyze a canvas frame off the script thread.
+
+        Returns ``((features, suggestion, visual_matches, objects), is_stale)``. When
+        the worker pool has not finished within ANALYSIS_WAIT_SECONDS, the
+        last completed result is returned with ``is_stale=True`` and the
+        job keeps running and ``run()`` reruns the script to pick it up. A
+        failed job falls back to the last result. An empty canvas
+        yields ``(None, False)``.
+        """
+        if json_data is not None and not json_data.get('objects'):
+            # Nothing drawn: skip the analysis, and with it loading OpenCV
+            st.session_state.last_analysis = None
+            st.session_state.pending_analysis = None
+            return None, False
+
+        cache = self.get_analysis_cache()
+        key = canvas_fingerprint(json_data, image_data)
+
+        # Re-analyze only when the drawing actually changed
+        result = cache.get(key)
+        if result is not None:
+            st.session_state.last_analysis = result
+            st.session_state.pending_analysis = None
+            return result, False
+
+        pending = st.session_state.get('pending_analysis')
+        if pending is None or pending[0] != key or pending[1] is None:
+            stroke_features = None
+            if json_data and json_data.get('objects'):
+                # Measure the vector strokes; much cheaper than raster analysis
+                stroke_features = self.get_stroke_extractor().update(json_data)
+            session_id = st.session_state.setdefault('session_id', uuid.uuid4().hex)
+            future = self.analysis_pool.submit(session_id, key, analyze_frame,
+                                               image_data, stroke_features is None,
+                                               emoji_db_path=self.emoji_matcher.emoji_db_path)
+            if future is not None:
+                cache.record_miss()
+            pending = (key, future, stroke_features)
+            st.session_state.pending_analysis = pending
+
+        _, future, stroke_features = pending
+        last_result = st.session_state.get('last_analysis')
+        if future is None:
+            # Rejected: the pool is saturated
+            self.analysis_poll_delay = ANALYSIS_RETRY_SECONDS
+            return last_result, True
+        try:
+            raster_features, visual_matches, objects = future.result(timeout=ANALYSIS_WAIT_SECONDS)
+        except TimeoutError:
+            self.analysis_poll_delay = ANALYSIS_POLL_SECONDS
+            return last_result, True
+        except CancelledError:
+            # Cancelled before it started; the next rerun submits again
+            st.session_state.pending_analysis = None
+            self.analysis_poll_delay = ANALYSIS_RETRY_SECONDS
+            return last_result, True
+        except Exception as e:
+            # Includes BrokenProcessPool; the next rerun submits again
+            print(f"Canvas analysis failed: {e!r}")
+            st.session_state.pending_analysis = None
+            return last_result, False
+
+        features = stroke_features if stroke_features is not None else raster_features
+        suggestion = self.image_processor.image_to_text_suggestion(features)
+        result = (features, suggestion, visual_matches, objects)
+        cache.put(key, result)
+        st.session_state.last_analysis = result
+        st.session_state.pending_analysis = None
+        return result, False
+
+    @timed('app.drawing_tab')
     def render_drawing_tab(self):
         """Render the drawing tab"""
         st.header("🎨 Draw Your Creation")
@@ -82,18 +270,28 @@ class DrawingToEmojiApp:
             canvas_result = self.drawing_canvas.render_canvas(key=f"canvas_{canvas_key}")
 
             # Image analysis
+            result = None
             if canvas_result.image_data is not None:
                 image_data = self.drawing_canvas.get_image_data(canvas_result)
-                pil_image = self.drawing_canvas.convert_to_pil_image(image_data)
 
-                if pil_image:
-                    # Analyze drawing features
-                    image_array = np.array(pil_image)
-                    features = self.image_processor.analyze_drawing_features(image_array)
+                if image_data is not None:
+                    result, is_stale = self.analyze_canvas(image_data, canvas_result.json_data)
+                    if is_stale:
+                        st.caption("⏳ Updating analysis...")
 
+                if result is not None:
+                    features, suggestion, visual_matches, objects = result
                     if features.get('has_content'):
-                        suggestion = self.image_processor.image_to_text_suggestion(features)
                         st.info(f"🤖 Drawing analysis suggests: **{suggestion}**")
+                    if visual_matches:
+                        emoji_display = " ".join(emoji for emoji, _ in visual_matches)
+                        st.markdown(f"**Looks like:** <span style='font-size: 30px;'>{emoji_display}</span>",
+                                    unsafe_allow_html=True)
+                    if len(objects) > 1:
+                        # One best emoji per separate object, largest first
+                        object_display = " ".join(obj['emojis'][0] for obj in objects if obj['emojis'])
+                        st.markdown(f"**Objects:** <span style='font-size: 30px;'>{object_display}</span>",
+                                    unsafe_allow_html=True)
 
         with col2:
             st.subheader("Drawing Description")
@@ -120,6 +318,7 @@ class DrawingToEmojiApp:
             - Include details like size or style
             """)
 
+    @timed('app.text_tab')
     def render_text_tab(self):
         """Render the text description tab"""
         st.header("📝 Describe Your Idea")
@@ -152,6 +351,7 @@ class DrawingToEmojiApp:
                 emoji_display = " ".join(category_emojis[:10])
                 st.markdown(f"<div style='font-size: 30px;'>{emoji_display}</div>", unsafe_allow_html=True)
 
+    @timed('app.search_tab')
     def render_search_tab(self):
         """Render the emoji search tab"""
         st.header("🔍 Emoji Search")
@@ -165,27 +365,35 @@ class DrawingToEmojiApp:
             )
 
             if search_query:
-                matching_emojis = self.emoji_matcher.search_emojis(search_query)
+                # A new query starts again at the first page
+                if st.session_state.get('search_page_query') != search_query:
+                    st.session_state.search_page_query = search_query
+                    st.session_state.search_page = 1
+                page = st.session_state.get('search_page', 1)
+
+                matching_emojis, total_matches = self.query_cache.search_emojis_with_count(
+                    self.emoji_matcher, search_query, limit=SEARCH_PAGE_SIZE,
+                    offset=(page - 1) * SEARCH_PAGE_SIZE)
+                n_pages = max(1, -(-total_matches // SEARCH_PAGE_SIZE))
+                if page > n_pages:
+                    # The database shrank under the current page
+                    page = st.session_state.search_page = n_pages
+                    matching_emojis, total_matches = self.query_cache.search_emojis_with_count(
+                        self.emoji_matcher, search_query, limit=SEARCH_PAGE_SIZE,
+                        offset=(page - 1) * SEARCH_PAGE_SIZE)
 
                 if matching_emojis:
-                    st.success(f"Found {len(matching_emojis)} emojis matching '{search_query}'")
-
-                    # Display emojis in grid
-                    cols = st.columns(6)
-                    for i, emoji in enumerate(matching_emojis[:18]):  # Show max 18 emojis
-                        with cols[i % 6]:
-                            emoji_info = self.emoji_matcher.get_emoji_info(emoji)
-                            st.markdown(f"<div style='text-align: center;'>"
-                                        f"<div style='font-size: 30px;'>{emoji}</div>"
-                                        f"<small>{', '.join(emoji_info['keywords'][:2])}</small>"
-                                        f"</div>", unsafe_allow_html=True)
+                    st.success(f"Found {total_matches} emojis matching '{search_query}'")
+                    st.markdown(self.result_renderer.render_grid(matching_emojis), unsafe_allow_html=True)
+                    if n_pages > 1:
+                        st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages,
+                                        step=1, key='search_page')
                 else:
                     st.warning(f"No emojis found matching '{search_query}'")
 
         with col2:
             st.subheader("Popular Searches")
-            popular_searches = ["love", "happy", "animal", "food", "celebration", "travel"]
-            for search in popular_searches:
+            for search in POPULAR_SEARCHES:
                 if st.button(f"🔍 {search.title()}", key=f"search_{search}"):
                     st.session_state.search_query = search
                     st.rerun()
@@ -194,45 +402,23 @@ class DrawingToEmojiApp:
         """Process input and display emoji results"""
         with st.spinner("Finding the perfect emojis..."):
             # Get emoji matches
-            matching_emojis = self.emoji_matcher.text_to_emoji(text_input, top_k=8)
+            matching_emojis = self.query_cache.text_to_emoji(self.emoji_matcher, text_input, top_k=8)
 
             if matching_emojis:
                 self.display_emoji_results(text_input, matching_emojis)
             else:
                 st.error("No matching emojis found. Try a different description.")
 
+    @timed('app.display_emoji_results')
     def display_emoji_results(self, text_input, matching_emojis):
         """Display the emoji matching results"""
         st.markdown("---")
         st.header("🎯 Matching Emojis")
 
-        # Best match
+        # Best match card and similar suggestions as one block
         if matching_emojis:
-            best_match = matching_emojis[0]
-            best_info = self.emoji_matcher.get_emoji_info(best_match)
-
-            col1, col2, col3 = st.columns([1, 2, 1])
-
-            with col2:
-                st.markdown("<div class='emoji-result'>", unsafe_allow_html=True)
-                st.markdown(f"<div class='emoji-display'>{best_match}</div>", unsafe_allow_html=True)
-                st.markdown(f"### Best Match")
-                st.markdown(f"**Keywords:** {', '.join(best_info['keywords'][:5])}")
-                st.markdown(f"**Category:** {best_info['category'].title()}")
-                st.markdown("</div>", unsafe_allow_html=True)
-
-            # Similar suggestions
-            st.subheader("Similar Suggestions")
-            cols = st.columns(8)
-            for i, emoji in enumerate(matching_emojis[1:]):
-                if i < 7:  # Show up to 7 suggestions
-                    with cols[i]:
-                        emoji_info = self.emoji_matcher.get_emoji_info(emoji)
-                        st.markdown(
-                            f"<div style='text-align: center; padding: 10px; border: 2px solid #e0e0e0; border-radius: 10px;'>"
-                            f"<div class='suggestion-emoji'>{emoji}</div>"
-                            f"<small>{emoji_info['category'].title()}</small>"
-                            f"</div>", unsafe_allow_html=True)
+            st.markdown(self.result_renderer.render_results(matching_emojis, max_suggestions=7),
+                        unsafe_allow_html=True)
 
             # Copy to clipboard functionality
             st.markdown("---")
@@ -250,8 +436,12 @@ class DrawingToEmojiApp:
                     st.session_state.text_input = ""
                     st.rerun()
 
-    def run(self):
-        """Main application runner"""
+    def run(self, poll_analysis=True):
+        """Main application runner.
+
+        With ``poll_analysis`` False the script never reruns itself to pick
+        up pending canvas analysis, e.g. while the rerun is being profiled.
+        """
         # Initialize session state
         if 'text_input' not in st.session_state:
             st.session_state.text_input = ""
@@ -284,6 +474,12 @@ class DrawingToEmojiApp:
             unsafe_allow_html=True
         )
 
+        # Nothing else reruns the script when an off-thread analysis
+        # finishes, so poll until it is shown
+        if poll_analysis and self.analysis_poll_delay is not None:
+            time.sleep(self.analysis_poll_delay)
+            st.rerun()
+
 
 def main():
     # Check if required files exist
@@ -293,7 +489,19 @@ def main():
 
     # Initialize and run the app
     app = DrawingToEmojiApp()
-    app.run()
+    metrics = get_metrics()
+    metrics_file = os.environ.get('EMOJI_METRICS_FILE')
+    if metrics_file:
+        # Exported on a timer rather than after every rerun
+        metrics.start_export(metrics_file, float(os.environ.get('EMOJI_METRICS_INTERVAL', 15)))
+    if st.session_state.pop('profile_next_rerun', False):
+        # st.rerun() would end the rerun inside the profiler and lose the report
+        _, report = profile_call(app.run, False)
+        with st.sidebar.expander("🧪 Profile of this rerun", expanded=True):
+            st.code(report, language="")
+    else:
+        with metrics.timer('app.rerun'):
+            app.run()
 
 
 if __name__ == "__main__":
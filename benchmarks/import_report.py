@@ -0,0 +1,119 @@
+"""Report the import cost of each subsystem, measured in fresh interpreters.
+
+Every scenario runs in its own ``python -X importtime`` subprocess, so
+module caches from one scenario never hide the cost of another. For each
+scenario the report lists the wall time, the total import time and which
+heavy third-party packages ended up loaded. The matcher scenarios load a
+freshly built index artifact, as a deployed app does after ``setup.sh``.
+Run from the repository root:
+
+    python -m benchmarks.import_report
+    python -m benchmarks.import_report --json imports.json --top 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ['streamlit', 'streamlit_drawable_canvas', 'sklearn', 'scipy', 'pandas',
+                 'cv2', 'PIL', 'matplotlib', 'plotly']
+
+EMOJI_DB = "assets/emoji_database.json"
+MATCHER = "from utils.emoji_matcher import EmojiMatcher\nmatcher = EmojiMatcher(index_path={index_path!r})\n"
+
+SCENARIOS = {
+    'app import': "import app",
+    'matcher load': MATCHER,
+    'text query': MATCHER + "matcher.text_to_emoji('happy cat')",
+    'keyword search': MATCHER + "matcher.search_emojis('hap')",
+    'batch query': MATCHER + "matcher.text_to_emoji_batch(['happy cat', 'pizza'])",
+    'matcher fit (no artifact)': "from utils.emoji_matcher import EmojiMatcher\n"
+                                 "EmojiMatcher(use_index_artifact=False)",
+    'image analysis': "import numpy as np\n"
+                      "from utils.image_processor import ImageProcessor\n"
+                      "ImageProcessor.analyze_drawing_features(np.full((64, 64, 4), 255, np.uint8))",
+}
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+heavy = {heavy!r}
+loaded = [name for name in heavy if name in sys.modules]
+print("@@REPORT@@" + json.dumps([elapsed, loaded]), file=sys.stderr)
+"""
+
+
+def parse_importtime(stderr):
+    """Return {module: (self_us, cumulative_us)} from ``-X importtime`` output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def run_scenario(code, cwd, index_path):
+    """Run ``code`` in a fresh interpreter and return its import report"""
+    probe = PROBE.format(code=code.format(index_path=index_path), heavy=HEAVY_MODULES)
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", probe],
+                               cwd=cwd, capture_output=True, text=True)
+    report_line = [line for line in completed.stderr.splitlines() if line.startswith("@@REPORT@@")]
+    if completed.returncode != 0 or not report_line:
+        return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr else "failed"}
+
+    elapsed, loaded = json.loads(report_line[0][len("@@REPORT@@"):])
+    modules = parse_importtime(completed.stderr)
+    # Cumulative time of each top-level package includes all of its submodules
+    top_level = {name: cumulative for name, (_, cumulative) in modules.items() if "." not in name}
+    return {
+        'wall_seconds': elapsed,
+        'import_seconds': sum(self_us for self_us, _ in modules.values()) / 1e6,
+        'heavy_modules': loaded,
+        'slowest_packages': sorted(top_level.items(), key=lambda item: -item[1]),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import cost per subsystem")
+    parser.add_argument('--json', help="also write the report to this file")
+    parser.add_argument('--top', type=int, default=5, help="slowest packages to list per scenario")
+    parser.add_argument('scenarios', nargs='*', help=f"subset of: {', '.join(SCENARIOS)}")
+    args = parser.parse_args(argv)
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    report = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        index_path = os.path.join(workdir, "emoji_database.idx")
+        subprocess.run([sys.executable, "-m", "utils.index_artifact", EMOJI_DB, index_path],
+                       cwd=root, check=True, capture_output=True)
+
+        for name in args.scenarios or SCENARIOS:
+            result = run_scenario(SCENARIOS[name], root, index_path)
+            if 'error' not in result:
+                result['slowest_packages'] = result['slowest_packages'][:args.top]
+            report[name] = result
+
+            print(f"== {name}")
+            if 'error' in result:
+                print(f"   failed: {result['error']}")
+                continue
+            print(f"   wall {result['wall_seconds'] * 1000:8.1f} ms, "
+                  f"imports {result['import_seconds'] * 1000:8.1f} ms")
+            print(f"   heavy modules: {', '.join(result['heavy_modules']) or 'none'}")
+            for package, cumulative_us in result['slowest_packages']:
+                print(f"   {cumulative_us / 1000:8.1f} ms  {package}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
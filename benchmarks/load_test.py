@@ -0,0 +1,294 @@
+"""Multi-session load test for the Streamlit app.
+
+Every simulated session is an ``AppTest`` instance running ``app.py`` in
+this process, on its own thread, so sessions share the process-wide
+matcher, caches and analysis pool exactly as they do on a server. The
+drawing canvas is replaced by a stand-in that replays scripted frames
+(raster plus fabric.js JSON, one stroke at a time). Each session repeats
+a realistic sequence: draw, describe and match, use the text tab, type a
+search one keystroke at a time and clear the canvas.
+
+For each concurrency level the report lists rerun latency percentiles,
+throughput, CPU use, resident memory and the size of every session's
+``st.session_state``. A session state that keeps growing from one
+iteration to the next is flagged as a probable leak. Run from the
+repository root:
+
+    python -m benchmarks.load_test --sessions 1 2 4 8 --iterations 3
+    python -m benchmarks.load_test --sessions 16 --think-ms 500 --json load.json
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_stroke_frames
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+FRAME_KEY = "load_test_canvas_frame"
+
+DESCRIPTIONS = ["happy face with smile", "cat with whiskers", "heart shape",
+                "sun over a house", "pizza slice", "tree with leaves"]
+SEARCHES = ["happy", "love", "cat", "food", "sun", "party"]
+
+
+def install_canvas_stand_in():
+    """Make ``st_canvas`` return the frame scripted in the session state"""
+    import streamlit as st
+    import streamlit_drawable_canvas
+    from streamlit_drawable_canvas import CanvasResult
+
+    def replay_canvas(width=400, height=400, **kwargs):
+        frame = st.session_state.get(FRAME_KEY)
+        if frame is None:
+            # What the component reports for an untouched canvas
+            return CanvasResult(np.zeros((height, width, 4), dtype=np.uint8), {'objects': []})
+        return CanvasResult(*frame)
+
+    streamlit_drawable_canvas.st_canvas = replay_canvas
+
+
+def share_test_runtime():
+    """Let many ``AppTest`` instances run at the same time in this process.
+
+    ``AppTest`` is written for one test at a time: each run installs its own
+    mock ``Runtime`` singleton and config override and removes them when it
+    finishes, which pulls them out from under any other session that is
+    still running. Install one runtime and one override for the whole
+    process instead, the way a server shares its runtime between sessions.
+    Scripts are also compiled one at a time, because ``ast.parse`` is not
+    safe to call from several threads at once on some CPython versions;
+    compilation is a negligible part of a rerun.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit import config
+    from streamlit.components.v2.component_manager import BidiComponentManager
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1.util import build_mock_config_get_option
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    components = BidiComponentManager()
+    components.discover_and_register_components(start_file_watching=False)
+    runtime.bidi_component_registry = components
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+
+    config.get_option = build_mock_config_get_option({"global.appTest": True})
+
+    lock = threading.Lock()
+    get_bytecode = ScriptCache.get_bytecode
+
+    def locked_get_bytecode(self, script_path):
+        with lock:
+            return get_bytecode(self, script_path)
+
+    ScriptCache.get_bytecode = locked_get_bytecode
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate bytes held by ``obj``, following containers and object attributes"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes + sys.getsizeof(obj) if obj.base is None else sys.getsizeof(obj)
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__') and not isinstance(obj, type):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def rss_mb():
+    """Current resident set size of this process in MiB"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        # Peak RSS; kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class SimulatedSession:
+    """One browser session replaying a scripted sequence of interactions"""
+
+    def __init__(self, index, n_strokes=6, think_time=0.0, timeout=60):
+        from streamlit.testing.v1 import AppTest
+
+        self.index = index
+        self.think_time = think_time
+        self.rng = np.random.default_rng(index)
+        self.frames = make_stroke_frames(n_strokes, seed=index)
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.latencies = []
+        self.errors = 0
+        self.state_bytes = []
+        self._started = False
+
+    def _rerun(self):
+        start = time.perf_counter()
+        self.app.run()
+        self.latencies.append(time.perf_counter() - start)
+        if len(self.app.exception):
+            self.errors += 1
+        if self.think_time:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.think_time)
+
+    def _click(self, label):
+        for button in self.app.button:
+            if button.label == label:
+                button.click()
+                self._rerun()
+                return
+        self.errors += 1
+
+    def play(self):
+        """Run one iteration of the interaction script"""
+        app = self.app
+        if not self._started:
+            self._rerun()
+            self._started = True
+
+        # Draw stroke by stroke; each new frame triggers a rerun
+        for frame in self.frames:
+            app.session_state[FRAME_KEY] = frame
+            self._rerun()
+
+        app.text_area(key="drawing_description").input(str(self.rng.choice(DESCRIPTIONS)))
+        self._rerun()
+        self._click("🎯 Find Matching Emojis")
+
+        app.text_area(key="text_description").input(str(self.rng.choice(DESCRIPTIONS)))
+        self._rerun()
+        self._click("🔍 Find Emojis")
+
+        query = str(self.rng.choice(SEARCHES))
+        for end in range(1, len(query) + 1):
+            app.text_input[0].input(query[:end])
+            self._rerun()
+
+        app.session_state[FRAME_KEY] = None
+        self._click("🗑️ Clear Canvas")
+        self.state_bytes.append(deep_sizeof(dict(app.session_state.items())))
+
+    def run(self, iterations):
+        for _ in range(iterations):
+            try:
+                self.play()
+            except Exception as e:
+                # A failed step leaves the session in an unknown state; stop it
+                print(f"Session {self.index} failed: {e!r}")
+                self.errors += 1
+                return
+
+
+def run_level(n_sessions, iterations, n_strokes, think_time, timeout):
+    """Run ``n_sessions`` concurrent sessions and return their aggregated measurements"""
+    sessions = [SimulatedSession(i, n_strokes, think_time, timeout) for i in range(n_sessions)]
+    threads = [threading.Thread(target=session.run, args=(iterations,), name=f"session-{i}")
+               for i, session in enumerate(sessions)]
+
+    rss_before = rss_mb()
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    rss_after = rss_mb()
+
+    cpu_seconds = ((usage_after.ru_utime - usage_before.ru_utime)
+                   + (usage_after.ru_stime - usage_before.ru_stime))
+    latencies = np.concatenate([session.latencies for session in sessions] + [[]]) * 1e3
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (np.nan,) * 3
+    finished = [session for session in sessions if session.state_bytes]
+    state_kb = [session.state_bytes[-1] / 1024 for session in finished] or [np.nan]
+    # Growth between the first and last iteration, per iteration
+    growth_kb = [(session.state_bytes[-1] - session.state_bytes[0]) / 1024 / (len(session.state_bytes) - 1)
+                 for session in finished if len(session.state_bytes) > 1] or [0.0]
+    return {
+        'sessions': n_sessions,
+        'reruns': int(len(latencies)),
+        'errors': sum(session.errors for session in sessions),
+        'p50_ms': p50,
+        'p95_ms': p95,
+        'p99_ms': p99,
+        'max_ms': float(latencies.max()) if len(latencies) else np.nan,
+        'reruns_per_s': len(latencies) / wall,
+        'cpu_percent': 100.0 * cpu_seconds / wall,
+        'rss_mb': rss_after,
+        'rss_per_session_mb': (rss_after - rss_before) / n_sessions,
+        'state_kb_per_session': float(np.mean(state_kb)),
+        'state_growth_kb_per_iteration': float(max(growth_kb)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive app.py with many simulated sessions")
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="concurrency levels to measure")
+    parser.add_argument('--iterations', type=int, default=3,
+                        help="interaction sequences per session (>= 2 to detect leaks)")
+    parser.add_argument('--strokes', type=int, default=6, help="strokes drawn per iteration")
+    parser.add_argument('--think-ms', type=float, default=0.0,
+                        help="mean pause between a session's interactions")
+    parser.add_argument('--timeout', type=float, default=60, help="seconds allowed per rerun")
+    parser.add_argument('--leak-kb', type=float, default=16.0,
+                        help="session state growth per iteration reported as a leak")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    install_canvas_stand_in()
+    share_test_runtime()
+    print("warming up shared resources...")
+    warmup = SimulatedSession(10 ** 6, args.strokes, 0.0, args.timeout)
+    warmup.run(1)
+
+    print(f"{'sessions':>8} {'reruns':>7} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'rerun/s':>8} {'cpu %':>6} {'rss MB':>8} {'MB/sess':>8} {'state KB':>9} {'growth KB':>10}")
+    results = []
+    leaks = False
+    failed = False
+    for n_sessions in args.sessions:
+        row = run_level(n_sessions, args.iterations, args.strokes, args.think_ms / 1000.0, args.timeout)
+        results.append(row)
+        leak = row['state_growth_kb_per_iteration'] > args.leak_kb
+        leaks = leaks or leak
+        failed = failed or row['errors'] > 0
+        print(f"{row['sessions']:>8} {row['reruns']:>7} {row['errors']:>4} {row['p50_ms']:>8.1f} "
+              f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['reruns_per_s']:>8.1f} "
+              f"{row['cpu_percent']:>6.0f} {row['rss_mb']:>8.1f} {row['rss_per_session_mb']:>8.2f} "
+              f"{row['state_kb_per_session']:>9.1f} {row['state_growth_kb_per_iteration']:>10.1f}"
+              + ("  <- session state keeps growing" if leak else ""))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'levels': results}, f, indent=2)
+    return 1 if leaks or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""Offline benchmark suite for the matcher, keyword search and image analysis.
+
+Generates synthetic emoji databases and canvases, then records cold-start
+time, per-call latency percentiles, batch throughput and peak memory in a
+flat JSON file. Run from the repository root:
+
+    python -m benchmarks.run_benchmarks -o before.json
+    python -m benchmarks.run_benchmarks -o after.json --baseline before.json --budget 0.2
+
+With ``--baseline``, any metric more than ``--budget`` (a fraction) worse
+than the baseline is reported and the run exits with status 1. Metric
+names ending in ``_per_s`` are higher-is-better; all others are
+lower-is-better. Tail percentiles (p95/p99) are recorded but not gated.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.synthetic import (make_canvas, make_prefixes, make_queries,
+                                  write_emoji_database)
+from utils.emoji_matcher import EmojiMatcher
+from utils.image_processor import ImageProcessor
+from utils.index_artifact import build_index_artifact
+
+DATABASE_SIZES = [40, 500, 5000, 50000]
+QUICK_DATABASE_SIZES = [40, 2000]
+CANVAS_SIZES = [200, 400, 800]
+INK_DENSITIES = [0.01, 0.05, 0.2]
+
+
+def time_calls(fn, args_list, min_seconds=0.0):
+    """Call ``fn(arg)`` for every arg and return per-call latencies in seconds"""
+    latencies = []
+    start = time.perf_counter()
+    while True:
+        for arg in args_list:
+            t0 = time.perf_counter()
+            fn(arg)
+            latencies.append(time.perf_counter() - t0)
+        if time.perf_counter() - start >= min_seconds:
+            return np.array(latencies)
+
+
+def latency_metrics(prefix, fn, args_list, min_seconds=0.1, rounds=3):
+    """Latency percentiles and call rate of ``fn`` over ``args_list``.
+
+    The median and call rate are the best of ``rounds`` rounds, as with
+    ``timeit``, so a busy machine inflates them less; tails are taken over
+    all calls.
+    """
+    runs = [time_calls(fn, args_list, min_seconds) for _ in range(rounds)]
+    latencies = np.concatenate(runs)
+    p95, p99 = np.percentile(latencies, [95, 99]) * 1e3
+    return {f"{prefix}.p50_ms": min(np.median(run) for run in runs) * 1e3,
+            f"{prefix}.p95_ms": p95, f"{prefix}.p99_ms": p99,
+            f"{prefix}.calls_per_s": max(len(run) / run.sum() for run in runs)}
+
+
+def peak_memory_mb(fn):
+    """Run ``fn`` under tracemalloc and return (result, peak MiB allocated)"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak / (1024 * 1024)
+
+
+def bench_matcher(n_emojis, n_queries, workdir, seed=0):
+    """Cold start, text matching, search and category lookups for one database size"""
+    db_path = os.path.join(workdir, f"emojis_{n_emojis}.json")
+    vocabulary = write_emoji_database(db_path, n_emojis, seed)
+    prefix = f"matcher.n{n_emojis}"
+    metrics = {}
+
+    start = time.perf_counter()
+    EmojiMatcher(db_path, use_index_artifact=False)
+    metrics[f"{prefix}.cold_start_fit_s"] = time.perf_counter() - start
+
+    build_index_artifact(db_path)
+    start = time.perf_counter()
+    matcher = EmojiMatcher(db_path)
+    metrics[f"{prefix}.cold_start_artifact_s"] = time.perf_counter() - start
+    assert matcher.loaded_from_artifact
+
+    _, metrics[f"{prefix}.fit_peak_mb"] = peak_memory_mb(
+        lambda: EmojiMatcher(db_path, use_index_artifact=False))
+    _, metrics[f"{prefix}.artifact_load_peak_mb"] = peak_memory_mb(lambda: EmojiMatcher(db_path))
+
+    queries = make_queries(vocabulary, n_queries, seed)
+    matcher.text_to_emoji(queries[0])  # Warm up
+    metrics.update(latency_metrics(f"{prefix}.text_to_emoji", matcher.text_to_emoji, queries))
+
+    batch = queries * max(1, 10000 // len(queries))
+    batch_seconds = time_calls(matcher.text_to_emoji_batch, [batch] * 3).min()
+    metrics[f"{prefix}.text_to_emoji_batch.queries_per_s"] = len(batch) / batch_seconds
+    _, metrics[f"{prefix}.text_to_emoji_batch.peak_mb"] = peak_memory_mb(
+        lambda: matcher.text_to_emoji_batch(batch))
+
+    prefixes = make_prefixes(vocabulary, n_queries, seed)
+    metrics.update(latency_metrics(f"{prefix}.search_emojis",
+                                   lambda q: matcher.search_emojis(q, limit=18), prefixes))
+
+    categories = matcher.get_all_categories()
+    metrics.update(latency_metrics(f"{prefix}.get_emoji_by_category",
+                                   matcher.get_emoji_by_category, categories, 0.02))
+    return metrics
+
+
+def bench_image(size, density, repeats, seed=0):
+    """Feature extraction latency for one canvas size and ink density"""
+    canvases = [make_canvas(size, density, seed + i) for i in range(repeats)]
+    ImageProcessor.analyze_drawing_features(canvases[0])  # Warm up
+    prefix = f"image.s{size}.d{density:g}"
+    metrics = latency_metrics(f"{prefix}.analyze_drawing_features",
+                              ImageProcessor.analyze_drawing_features, canvases)
+    metrics.update(latency_metrics(f"{prefix}.analyze_objects", ImageProcessor.analyze_objects, canvases))
+    _, metrics[f"{prefix}.peak_mb"] = peak_memory_mb(
+        lambda: ImageProcessor.analyze_drawing_features(canvases[0]))
+    return metrics
+
+
+def run_suite(sizes, n_queries, canvas_repeats, seed=0):
+    # Fitting imports scikit-learn lazily; keep that out of the cold-start
+    # numbers, import cost is what benchmarks.import_report measures
+    import sklearn.feature_extraction.text  # noqa: F401
+
+    metrics = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_emojis in sizes:
+            print(f"matcher: {n_emojis} emojis")
+            metrics.update(bench_matcher(n_emojis, n_queries, workdir, seed))
+    for size in CANVAS_SIZES:
+        for density in INK_DENSITIES:
+            print(f"image: {size}px, ink density {density:g}")
+            metrics.update(bench_image(size, density, canvas_repeats, seed))
+    return {name: float(value) for name, value in metrics.items()}
+
+
+def compare(metrics, baseline, budget, noise_ms=0.02):
+    """Return a list of (name, baseline, current, change) for metrics over budget.
+
+    Tail percentiles are reported but not gated, and latency changes
+    smaller than ``noise_ms`` are ignored; both are dominated by scheduler
+    and timer noise on a shared machine.
+    """
+    regressions = []
+    for name, current in sorted(metrics.items()):
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if name.endswith(("p95_ms", "p99_ms")):
+            continue
+        if name.endswith("_ms") and current - previous < noise_ms:
+            continue
+        if name.endswith("_per_s"):
+            change = (previous - current) / previous
+        else:
+            change = (current - previous) / previous
+        if change > budget:
+            regressions.append((name, previous, current, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite")
+    parser.add_argument('-o', '--output', default="benchmark_results.json", help="results JSON")
+    parser.add_argument('--baseline', help="earlier results JSON to compare against")
+    parser.add_argument('--budget', type=float, default=0.25,
+                        help="allowed slowdown per metric as a fraction (default 0.25)")
+    parser.add_argument('--noise-ms', type=float, default=0.02,
+                        help="ignore latency changes smaller than this (default 0.02 ms)")
+    parser.add_argument('--sizes', type=int, nargs='+', help="emoji database sizes")
+    parser.add_argument('--quick', action='store_true', help="small sizes for a fast smoke run")
+    parser.add_argument('--queries', type=int, default=500, help="queries per latency measurement")
+    parser.add_argument('--canvases', type=int, default=20, help="canvases per image configuration")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes or (QUICK_DATABASE_SIZES if args.quick else DATABASE_SIZES)
+    metrics = run_suite(sizes, args.queries, args.canvases, args.seed)
+    results = {
+        'meta': {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': args.seed,
+            'sizes': sizes,
+        },
+        'metrics': metrics,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Wrote {len(metrics)} metrics to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['metrics']
+        regressions = compare(metrics, baseline, args.budget, args.noise_ms)
+        for name, previous, current, change in regressions:
+            print(f"REGRESSION {name}: {previous:.4g} -> {current:.4g} ({change:+.0%})")
+        if regressions:
+            return 1
+        print(f"No metric regressed by more than {args.budget:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""Deterministic synthetic inputs for the benchmark suite"""
+import json
+
+import cv2
+import numpy as np
+
+CATEGORIES = ["faces", "animals", "food", "nature", "objects", "activities", "travel",
+              "symbols", "flags", "people", "weather", "music", "sports", "tools",
+              "plants", "buildings", "vehicles", "clothing", "hearts", "hands"]
+BASE_WORDS = ["happy", "sad", "smile", "laugh", "love", "heart", "cat", "dog", "sun",
+              "moon", "star", "tree", "flower", "pizza", "cake", "car", "plane", "house",
+              "party", "music", "ball", "fire", "water", "snow", "rain", "book", "phone",
+              "money", "gift", "hand", "face", "eyes", "red", "blue", "green", "yellow",
+              "cold", "hot", "fast", "slow", "big", "small", "night", "day", "food", "fruit"]
+
+
+def make_vocabulary(size, seed=0):
+    """Return ``size`` distinct pseudo-words, starting with real keywords"""
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    words = list(BASE_WORDS[:size])
+    seen = set(words)
+    while len(words) < size:
+        word = "".join(rng.choice(letters, rng.integers(3, 10)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def synthetic_emoji(i):
+    """Return a unique emoji-like string for entry ``i``"""
+    if i < 0x1FAFF - 0x1F300:
+        return chr(0x1F300 + i)
+    if i < 0x1FAFF - 0x1F300 + 0xFFFE:
+        return chr(0xF0000 + i - (0x1FAFF - 0x1F300))  # Supplementary private use area
+    return f":sticker_{i}:"  # Custom sticker catalogs use shortcodes
+
+
+def make_emoji_database(n_emojis, seed=0, vocabulary_size=None):
+    """Build a database dict shaped like assets/emoji_database.json.
+
+    Keywords are drawn from a Zipf-like distribution so that a few words
+    are shared by many emojis, as in the real database.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary_size = vocabulary_size or max(50, min(20000, n_emojis // 2))
+    vocabulary = make_vocabulary(vocabulary_size, seed)
+    weights = 1.0 / np.arange(1, vocabulary_size + 1)
+    weights /= weights.sum()
+
+    # Draw more words than needed per entry, then keep the first distinct ones
+    n_keywords = rng.integers(3, 8, size=n_emojis)
+    draws = rng.choice(vocabulary_size, size=(n_emojis, 12), p=weights)
+    phrase = rng.random(n_emojis) < 0.2
+    categories = rng.integers(len(CATEGORIES), size=n_emojis)
+
+    emojis = {}
+    for i in range(n_emojis):
+        word_ids = list(dict.fromkeys(draws[i].tolist()))[:n_keywords[i]]
+        keywords = [vocabulary[w] for w in word_ids]
+        if phrase[i] and len(keywords) > 1:
+            keywords.append(f"{keywords[0]} {keywords[1]}")
+        emojis[synthetic_emoji(i)] = {
+            'keywords': keywords,
+            'category': CATEGORIES[categories[i]],
+        }
+    return {'emojis': emojis}
+
+
+def write_emoji_database(path, n_emojis, seed=0):
+    """Write a synthetic database to ``path`` and return its vocabulary"""
+    database = make_emoji_database(n_emojis, seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(database, f, ensure_ascii=False)
+    return sorted({word for entry in database['emojis'].values()
+                   for keyword in entry['keywords'] for word in keyword.split()})
+
+
+def make_queries(vocabulary, n_queries, seed=0, words_per_query=(1, 4)):
+    """Return ``n_queries`` space-separated queries, some with unknown words"""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _ in range(n_queries):
+        n_words = int(rng.integers(words_per_query[0], words_per_query[1] + 1))
+        words = [vocabulary[int(rng.integers(len(vocabulary)))] for _ in range(n_words)]
+        if rng.random() < 0.1:
+            words.append("zzzunknown")
+        queries.append(" ".join(words))
+    return queries
+
+
+def make_prefixes(vocabulary, n_queries, seed=0):
+    """Return search-box style prefixes of vocabulary words"""
+    rng = np.random.default_rng(seed)
+    prefixes = []
+    for _ in range(n_queries):
+        word = vocabulary[int(rng.integers(len(vocabulary)))]
+        prefixes.append(word[:int(rng.integers(1, len(word) + 1))])
+    return prefixes
+
+
+def make_canvas(size, ink_density, seed=0, stroke_width=6):
+    """Draw random strokes on a white RGBA canvas until ``ink_density`` is reached.
+
+    Mixes circles, straight lines and free-hand polylines, like real
+    drawings from the app's canvas.
+    """
+    rng = np.random.default_rng(seed)
+    canvas = np.zeros((size, size, 4), dtype=np.uint8)
+    ink = np.zeros((size, size), dtype=np.uint8)
+    target = ink_density * size * size
+
+    for _ in range(10000):
+        if ink_density <= 0 or cv2.countNonZero(ink) >= target:
+            break
+        shape = rng.integers(3)
+        if shape == 0:
+            center = tuple(int(v) for v in rng.integers(0, size, 2))
+            radius = int(rng.integers(size // 20 + 1, size // 3 + 2))
+            cv2.circle(ink, center, radius, 255, stroke_width)
+        elif shape == 1:
+            p1, p2 = (tuple(int(v) for v in rng.integers(0, size, 2)) for _ in range(2))
+            cv2.line(ink, p1, p2, 255, stroke_width)
+        else:
+            steps = rng.normal(0, size / 30, (20, 2)).cumsum(axis=0)
+            points = (steps + rng.integers(0, size, 2)).astype(np.int32)
+            cv2.polylines(ink, [points], False, 255, stroke_width)
+
+    # Transparent background with opaque black ink, as streamlit-drawable-canvas sends
+    canvas[..., 3] = ink
+    return canvas
+
+
+def make_stroke_frames(n_strokes, size=400, seed=0, stroke_width=10):
+    """Return the canvas frames of a drawing made stroke by stroke.
+
+    Each frame is ``(image_data, json_data)`` as streamlit-drawable-canvas
+    reports it after one more free-hand stroke: an RGBA array plus the
+    fabric.js objects, with circles, straight lines and scribbles.
+    """
+    rng = np.random.default_rng(seed)
+    ink = np.zeros((size, size), dtype=np.uint8)
+    objects = []
+    frames = []
+    for _ in range(n_strokes):
+        shape = rng.integers(3)
+        if shape == 0:
+            center = rng.uniform(size * 0.2, size * 0.8, 2)
+            radius = rng.uniform(size * 0.05, size * 0.2)
+            angles = np.linspace(0, 2 * np.pi, 32)
+            points = center + radius * np.column_stack([np.cos(angles), np.sin(angles)])
+        elif shape == 1:
+            points = rng.uniform(0, size, (2, 2))
+        else:
+            points = rng.normal(0, size / 40, (24, 2)).cumsum(axis=0) + rng.uniform(0, size, 2)
+        points = np.clip(points, 0, size - 1)
+        cv2.polylines(ink, [points.astype(np.int32)], False, 255, stroke_width)
+
+        (left, top), (right, bottom) = points.min(axis=0), points.max(axis=0)
+        path = [['M', float(points[0, 0]), float(points[0, 1])]]
+        path.extend(['L', float(x), float(y)] for x, y in points[1:])
+        objects.append({'type': 'path', 'left': float(left), 'top': float(top),
+                        'width': float(right - left), 'height': float(bottom - top),
+                        'scaleX': 1, 'scaleY': 1, 'angle': 0, 'fill': None,
+                        'stroke': '#000000', 'strokeWidth': stroke_width, 'path': path})
+
+        image = np.zeros((size, size, 4), dtype=np.uint8)
+        image[..., 3] = ink
+        frames.append((image, {'version': '4.4.0', 'objects': list(objects)}))
+    return frames
@@ -0,0 +1,293 @@
+"""Headless HTTP API for emoji matching.
+
+Standard library only (asyncio), on top of the same shared matcher and
+image processor as the Streamlit app:
+
+    POST /match     {"text": "happy face", "top_k": 5}     -> {"emojis": [...]}
+    GET  /search?q=hap&limit=18                              -> {"emojis": [...], "total": N}
+    POST /analyze   PNG body (Content-Type: image/png)       -> {"features": {...}, ...}
+    GET  /health, GET /stats
+    GET  /metrics                                            -> Prometheus text (EMOJI_METRICS=1)
+
+Concurrent /match requests are collected into micro-batches and scored
+together with ``EmojiMatcher.text_to_emoji_batch``. The database file is
+watched and edits are applied in the background without a restart.
+
+Run with ``python emoji_service.py --port 8502``.
+"""
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+import numpy as np
+
+from utils.analysis_pool import analyze_frame
+from utils.metrics import get_metrics
+from utils.shared_resources import get_shared_resources
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+MAX_TOP_K = 100
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class MicroBatcher:
+    """Collects concurrent text queries and scores them in one batch.
+
+    A batch is flushed when it reaches ``max_batch`` queries or when the
+    oldest query has waited ``max_wait`` seconds. Scoring runs on an
+    executor so the event loop keeps accepting requests meanwhile.
+    """
+
+    def __init__(self, get_matcher, executor, max_batch=256, max_wait=0.002):
+        self.get_matcher = get_matcher
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = asyncio.Queue()
+        self._task = None
+        self.batches = 0
+        self.queries = 0
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def match(self, text, top_k):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, top_k, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _, _ in batch]
+            # A longer top-k list starts with every shorter one, so score once
+            top_k = max(k for _, k, _ in batch)
+            try:
+                # Resolved per batch so a reloaded database takes effect
+                matcher = self.get_matcher()
+                results = await loop.run_in_executor(
+                    self.executor, matcher.text_to_emoji_batch, texts, top_k)
+            except Exception as exc:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+
+            self.batches += 1
+            self.queries += len(batch)
+            for (_, k, future), emojis in zip(batch, results):
+                if not future.done():
+                    future.set_result(emojis[:k])
+
+
+class EmojiService:
+    def __init__(self, emoji_db_path="assets/emoji_database.json", workers=4,
+                 max_batch=256, max_wait=0.002, watch_interval=2.0):
+        self.emoji_db_path = emoji_db_path
+        shared = get_shared_resources()
+        shared.get_emoji_matcher(emoji_db_path)
+        if watch_interval > 0:
+            shared.start_watcher(watch_interval)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='emoji-service')
+        self.batcher = MicroBatcher(lambda: self.matcher, self.executor, max_batch, max_wait)
+        self.requests = 0
+        self.started = time.time()
+
+    @property
+    def matcher(self):
+        """Current version of the shared matcher"""
+        return get_shared_resources().get_emoji_matcher(self.emoji_db_path)
+
+    async def handle_match(self, body):
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "body must be JSON")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "body must be a JSON object")
+        text = payload.get('text')
+        top_k = payload.get('top_k', 5)
+        if not isinstance(text, str):
+            raise HTTPError(400, "'text' must be a string")
+        if not isinstance(top_k, int) or not 1 <= top_k <= MAX_TOP_K:
+            raise HTTPError(400, f"'top_k' must be an integer between 1 and {MAX_TOP_K}")
+        return {'emojis': await self.batcher.match(text, top_k)}
+
+    def handle_search(self, query):
+        params = parse_qs(query)
+        q = params.get('q', [''])[0]
+        try:
+            limit = int(params.get('limit', ['18'])[0])
+        except ValueError:
+            raise HTTPError(400, "'limit' must be an integer")
+        emojis, total = get_shared_resources().get_query_cache().search_emojis_with_count(
+            self.matcher, q, limit=max(0, limit))
+        return {'emojis': emojis, 'total': total}
+
+    async def handle_analyze(self, body):
+        if not body:
+            raise HTTPError(400, "body must be a PNG or JPEG image")
+        try:
+            image = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        except cv2.error:
+            image = None
+        if image is None:
+            raise HTTPError(400, "body must be a PNG or JPEG image")
+        if image.ndim == 3:
+            code = cv2.COLOR_BGRA2RGBA if image.shape[2] == 4 else cv2.COLOR_BGR2RGB
+            image = cv2.cvtColor(image, code)
+
+        loop = asyncio.get_running_loop()
+        features, visual_matches, objects = await loop.run_in_executor(
+            self.executor, partial(analyze_frame, image, emoji_db_path=self.emoji_db_path))
+        processor = get_shared_resources().get_image_processor()
+        return {
+            'features': {name: bool(value) for name, value in features.items()},
+            'suggestion': processor.image_to_text_suggestion(features),
+            'visual_matches': [{'emoji': emoji, 'score': score} for emoji, score in visual_matches],
+            'objects': [{'bbox': list(obj['bbox']), 'suggestion': obj['suggestion'], 'emojis': obj['emojis']}
+                        for obj in objects],
+        }
+
+    def handle_stats(self):
+        return {
+            'requests': self.requests,
+            'uptime_seconds': time.time() - self.started,
+            'match_batches': self.batcher.batches,
+            'match_queries': self.batcher.queries,
+            'emojis': len(self.matcher.emoji_list),
+            'matcher_version': self.matcher.version,
+            'shared_resources': get_shared_resources().get_stats(),
+            'query_cache': get_shared_resources().get_query_cache().get_stats(),
+        }
+
+    async def route(self, method, path, query, body):
+        if path == '/match':
+            if method != 'POST':
+                raise HTTPError(405, "use POST")
+            return await self.handle_match(body)
+        if path == '/search':
+            return self.handle_search(query)
+        if path == '/analyze':
+            if method != 'POST':
+                raise HTTPError(405, "use POST")
+            return await self.handle_analyze(body)
+        if path == '/health':
+            return {'status': 'ok'}
+        if path == '/stats':
+            return self.handle_stats()
+        if path == '/metrics':
+            return get_metrics().render_prometheus()
+        raise HTTPError(404, f"no route for {path}")
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                lines = head.decode('latin-1').split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, sep, value = line.partition(":")
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+
+                keep_alive = (version == "HTTP/1.1"
+                              and headers.get('connection', '').lower() != 'close')
+                status, payload = 200, None
+                try:
+                    length = int(headers.get('content-length', 0))
+                    if length > MAX_BODY_BYTES:
+                        keep_alive = False
+                        raise HTTPError(413, "body too large")
+                    body = await reader.readexactly(length) if length else b""
+                    url = urlsplit(target)
+                    self.requests += 1
+                    payload = await self.route(method.upper(), url.path, url.query, body)
+                except HTTPError as exc:
+                    status, payload = exc.status, {'error': str(exc)}
+                except ValueError:
+                    status, payload = 400, {'error': "invalid Content-Length"}
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as exc:
+                    status, payload = 500, {'error': str(exc)}
+
+                if isinstance(payload, str):
+                    data, content_type = payload.encode('utf-8'), "text/plain; version=0.0.4"
+                else:
+                    data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                    content_type = "application/json"
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    .encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=1024)
+        print(f"Emoji service listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless emoji matching HTTP service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--db', default="assets/emoji_database.json", help="emoji database JSON")
+    parser.add_argument('--workers', type=int, default=4, help="threads for scoring and image analysis")
+    parser.add_argument('--max-batch', type=int, default=256, help="largest /match micro-batch")
+    parser.add_argument('--max-wait-ms', type=float, default=2.0,
+                        help="how long a /match request may wait for its batch to fill")
+    parser.add_argument('--watch-interval', type=float, default=2.0,
+                        help="seconds between checks for database edits (0 disables)")
+    args = parser.parse_args()
+
+    service = EmojiService(args.db, args.workers, args.max_batch, args.max_wait_ms / 1000.0,
+                           args.watch_interval)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -20,6 +20,9 @@ if [ ! -f "assets/emoji_database.json" ]; then
     exit 1
 fi
 
+# Compile the memory-mapped emoji index for fast startup
+python -m utils.index_artifact assets/emoji_database.json
+
 echo "Setup complete!"
 echo "To run the app:"
 echo "source emoji_env/bin/activate && streamlit run app.py"
\ No newline at end of file
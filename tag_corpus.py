@@ -0,0 +1,286 @@
+"""Tag large corpora of drawings and descriptions with emojis offline.
+
+Inputs may be directories of images (walked recursively), single image
+files, JSONL files (one record per line, text taken from --text-field) or
+plain text files (one description per line). Inputs are streamed lazily;
+image decoding and analysis are fanned out across a process pool while
+text is scored in batches in the main process. Results are written in
+input order as JSONL or CSV.
+
+Progress is checkpointed next to the output file, so an interrupted run
+continues where it stopped with ``--resume``:
+
+    python tag_corpus.py sketches/ captions.jsonl -o tags.jsonl --workers 8
+    python tag_corpus.py sketches/ captions.jsonl -o tags.jsonl --workers 8 --resume
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from utils.image_processor import ImageProcessor
+from utils.shared_resources import get_shared_resources
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp', '.webp'}
+JSONL_EXTENSIONS = {'.jsonl', '.ndjson'}
+FEATURE_NAMES = ['has_content', 'is_circular', 'has_lines', 'is_filled']
+CSV_COLUMNS = ['id', 'kind', 'emojis', 'suggestion'] + FEATURE_NAMES + ['error']
+
+
+def analyze_image_files(paths, max_side=None):
+    """Decode and analyze a chunk of image files in a worker process.
+
+    Returns one ``(features, error)`` pair per path.
+    """
+    results = []
+    for path in paths:
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            results.append((None, "could not decode image"))
+            continue
+        if image.ndim == 3:
+            code = cv2.COLOR_BGRA2RGBA if image.shape[2] == 4 else cv2.COLOR_BGR2RGB
+            image = cv2.cvtColor(image, code)
+        features, _ = ImageProcessor.analyze_canvas(image, max_side=max_side)
+        results.append(({name: bool(value) for name, value in features.items()}, None))
+    return results
+
+
+def _walk_images(root):
+    """Yield image paths under ``root`` in a stable, sorted order"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                yield os.path.join(dirpath, name)
+
+
+def _iter_text_records(path, text_field, id_field):
+    """Yield (id, text, error) for every line of a JSONL or plain text file"""
+    is_jsonl = os.path.splitext(path)[1].lower() in JSONL_EXTENSIONS
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.rstrip("\r\n")
+            default_id = f"{path}:{lineno}"
+            if not is_jsonl:
+                yield default_id, line, None
+                continue
+            if not line.strip():
+                yield default_id, "", "empty line"
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield default_id, "", "invalid JSON"
+                continue
+            if isinstance(record, str):
+                yield default_id, record, None
+            elif isinstance(record, dict) and isinstance(record.get(text_field), str):
+                yield str(record.get(id_field, default_id)), record[text_field], None
+            else:
+                yield default_id, "", f"missing '{text_field}' field"
+
+
+def iter_items(inputs, text_field='text', id_field='id'):
+    """Yield ('image', path, None, None) and ('text', id, text, error) items in input order"""
+    for path in inputs:
+        if os.path.isdir(path):
+            for image_path in _walk_images(path):
+                yield 'image', image_path, None, None
+        elif os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+            yield 'image', path, None, None
+        else:
+            for item_id, text, error in _iter_text_records(path, text_field, id_field):
+                yield 'text', item_id, text, error
+
+
+def iter_chunks(items, chunk_size):
+    """Group items into lists of at most ``chunk_size`` items of one kind"""
+    for kind, group in itertools.groupby(items, key=lambda item: item[0]):
+        while True:
+            chunk = list(itertools.islice(group, chunk_size))
+            if not chunk:
+                break
+            yield kind, chunk
+
+
+class Checkpoint:
+    """Records how many items have been written and the output size at that point"""
+
+    def __init__(self, output_path):
+        self.path = output_path + ".ckpt"
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, state):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+
+class CorpusTagger:
+    """Streams inputs through the matcher and writes ordered results"""
+
+    def __init__(self, matcher, output, fmt='jsonl', workers=None, chunk_size=64,
+                 top_k=5, max_side=None):
+        self.matcher = matcher
+        self.output = output
+        self.format = fmt
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.top_k = top_k
+        self.max_side = max_side
+        # Chunks submitted ahead of the writer; bounds memory for any input size
+        self.max_pending = self.workers * 2
+
+    def _format_rows(self, rows):
+        if self.format == 'jsonl':
+            return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            features = row.get('features') or {}
+            writer.writerow([row['id'], row['kind'], " ".join(row.get('emojis', [])),
+                             row.get('suggestion', '')]
+                            + [features.get(name, '') for name in FEATURE_NAMES]
+                            + [row.get('error', '')])
+        return buffer.getvalue()
+
+    def _text_rows(self, chunk):
+        texts = [text for _, _, text, _ in chunk]
+        rows = []
+        for (_, item_id, _, error), emojis in zip(chunk, self.matcher.text_to_emoji_batch(texts, self.top_k)):
+            row = {'id': item_id, 'kind': 'text'}
+            if error:
+                row['error'] = error
+            else:
+                row['emojis'] = emojis
+            rows.append(row)
+        return rows
+
+    def _image_rows(self, chunk, analyses):
+        suggestions = [ImageProcessor.image_to_text_suggestion(features)
+                       for features, _ in analyses if features is not None]
+        matches = zip(suggestions, self.matcher.text_to_emoji_batch(suggestions, self.top_k))
+
+        rows = []
+        for (_, path, _, _), (features, error) in zip(chunk, analyses):
+            row = {'id': path, 'kind': 'image'}
+            if error:
+                row['error'] = error
+            else:
+                row['features'] = features
+                row['suggestion'], row['emojis'] = next(matches)
+            rows.append(row)
+        return rows
+
+    def run(self, items, skip=0, on_progress=None):
+        """Tag ``items`` after skipping the first ``skip``; returns the number written"""
+        items = itertools.islice(items, skip, None)
+        done = skip
+        pending = deque()
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            def flush_one():
+                nonlocal done
+                kind, chunk, future = pending.popleft()
+                if kind == 'image':
+                    rows = self._image_rows(chunk, future.result())
+                else:
+                    rows = self._text_rows(chunk)
+                self.output.write(self._format_rows(rows))
+                done += len(chunk)
+                if on_progress is not None:
+                    on_progress(done)
+
+            for kind, chunk in iter_chunks(items, self.chunk_size):
+                future = None
+                if kind == 'image':
+                    paths = [path for _, path, _, _ in chunk]
+                    future = pool.submit(analyze_image_files, paths, self.max_side)
+                pending.append((kind, chunk, future))
+                while len(pending) > self.max_pending:
+                    flush_one()
+            while pending:
+                flush_one()
+        return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tag drawings and descriptions with emojis in bulk")
+    parser.add_argument('inputs', nargs='+', help="image directories, image files, JSONL or text files")
+    parser.add_argument('-o', '--output', required=True, help="output file")
+    parser.add_argument('--format', choices=['jsonl', 'csv'],
+                        help="output format (default: from the output extension)")
+    parser.add_argument('--db', default="assets/emoji_database.json", help="emoji database JSON")
+    parser.add_argument('--workers', type=int, default=None, help="image analysis processes")
+    parser.add_argument('--chunk-size', type=int, default=64, help="items per work unit")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--max-side', type=int, default=None,
+                        help="downscale larger images to this side before analysis")
+    parser.add_argument('--text-field', default='text', help="JSONL field holding the description")
+    parser.add_argument('--id-field', default='id', help="JSONL field holding the record id")
+    parser.add_argument('--resume', action='store_true', help="continue from the last checkpoint")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+    checkpoint = Checkpoint(args.output)
+    run_config = {'inputs': args.inputs, 'format': fmt, 'top_k': args.top_k,
+                  'text_field': args.text_field, 'id_field': args.id_field}
+
+    skip, offset = 0, 0
+    if args.resume:
+        state = checkpoint.load()
+        if state is not None:
+            if state.get('config') != run_config:
+                print("Checkpoint was written with different arguments; refusing to resume")
+                return 2
+            if state.get('finished'):
+                print(f"{args.output} is already complete ({state['items']} items)")
+                return 0
+            skip, offset = state['items'], state['bytes']
+
+    if offset:
+        with open(args.output, 'r+b') as f:
+            f.truncate(offset)
+        output = open(args.output, 'a', encoding='utf-8', newline='')
+        print(f"Resuming after {skip} items")
+    else:
+        output = open(args.output, 'w', encoding='utf-8', newline='')
+        if fmt == 'csv':
+            csv.writer(output).writerow(CSV_COLUMNS)
+
+    matcher = get_shared_resources().get_emoji_matcher(args.db)
+    tagger = CorpusTagger(matcher, output, fmt, args.workers, args.chunk_size,
+                          args.top_k, args.max_side)
+
+    def on_progress(done):
+        output.flush()
+        checkpoint.save({'config': run_config, 'items': done, 'bytes': output.tell()})
+
+    with output:
+        items = iter_items(args.inputs, args.text_field, args.id_field)
+        done = tagger.run(items, skip=skip, on_progress=on_progress)
+        output.flush()
+        checkpoint.save({'config': run_config, 'items': done, 'bytes': output.tell(),
+                         'finished': True})
+    print(f"Tagged {done} items into {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
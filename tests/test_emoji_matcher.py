@@ -0,0 +1,160 @@
+"""Equivalence checks for the matcher on a synthetic database.
+
+Results are compared through their scores, not emoji order: entries with
+equal scores may be returned in a different order by each path.
+"""
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import (make_emoji_database, make_prefixes, make_queries,
+                                  synthetic_emoji, write_emoji_database)
+from utils.emoji_matcher import EmojiMatcher
+
+N_EMOJIS = 400
+TOP_K = 8
+
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("db") / "emojis.json")
+    vocabulary = write_emoji_database(path, N_EMOJIS, seed=0)
+    return path, vocabulary
+
+
+@pytest.fixture(scope="module")
+def matcher(database):
+    return EmojiMatcher(database[0], use_index_artifact=False)
+
+
+@pytest.fixture(scope="module")
+def queries(database):
+    return make_queries(database[1], 200, seed=1) + ["", "zzzunknown", "the and of"]
+
+
+def reference_model(matcher):
+    """Fit the original scikit-learn TF-IDF model on the matcher's entries"""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    vectorizer = TfidfVectorizer(**EmojiMatcher.VECTORIZER_PARAMS)
+    documents = vectorizer.fit_transform(
+        [' '.join(matcher.emojis[emoji]['keywords']) for emoji in matcher.emoji_list])
+    return vectorizer, documents
+
+
+def result_scores(matcher, vectorizer, documents, text, emojis):
+    """Reference cosine similarity of ``text`` to each of ``emojis``"""
+    emoji_ids = {emoji: emoji_id for emoji_id, emoji in enumerate(matcher.emoji_list)}
+    similarities = (vectorizer.transform([text]) @ documents.T).toarray()[0]
+    return similarities[[emoji_ids[emoji] for emoji in emojis]]
+
+
+def test_text_to_emoji_matches_sklearn_knn(matcher, queries):
+    """The inverted index ranks like the original cosine NearestNeighbors model"""
+    from sklearn.neighbors import NearestNeighbors
+
+    vectorizer, documents = reference_model(matcher)
+    knn = NearestNeighbors(n_neighbors=TOP_K, metric='cosine').fit(documents.toarray())
+    for text in queries:
+        if not text:
+            continue
+        distances, _ = knn.kneighbors(vectorizer.transform([text]).toarray(), n_neighbors=TOP_K)
+        result = matcher.text_to_emoji(text, top_k=TOP_K)
+        assert len(set(result)) == TOP_K
+        np.testing.assert_allclose(result_scores(matcher, vectorizer, documents, text, result),
+                                   1.0 - distances[0], atol=1e-5)
+
+
+def test_text_to_emoji_batch_matches_single_queries(matcher, queries):
+    """Batch scoring returns the per-query results, whatever the chunking"""
+    vectorizer, documents = reference_model(matcher)
+    expected = [matcher.text_to_emoji(text, top_k=TOP_K) for text in queries]
+    for chunk_size in (None, 7):
+        results = matcher.text_to_emoji_batch(queries, top_k=TOP_K, chunk_size=chunk_size)
+        assert len(results) == len(queries)
+        for text, result, single in zip(queries, results, expected):
+            if not text:
+                assert result == single
+                continue
+            np.testing.assert_allclose(result_scores(matcher, vectorizer, documents, text, result),
+                                       result_scores(matcher, vectorizer, documents, text, single),
+                                       atol=1e-5)
+
+    streamed = matcher.text_to_emoji_batch(iter(queries), top_k=TOP_K, stream=True)
+    assert [len(result) for result in streamed] == [TOP_K] * len(queries)
+
+
+def edited_database(path, n_removed, n_updated, n_added):
+    """Remove, update and add entries of the database at ``path``; returns the new mapping"""
+    with open(path, encoding='utf-8') as f:
+        emojis = json.load(f)['emojis']
+    entries = list(emojis.items())
+    edited = dict(entries[n_removed:])
+    for emoji, data in entries[n_removed:n_removed + n_updated]:
+        edited[emoji] = {'keywords': data['keywords'][1:] + ['zzznewword'], 'category': data['category']}
+    extra = make_emoji_database(n_added, seed=5)['emojis']
+    for i, data in enumerate(extra.values()):
+        edited[synthetic_emoji(N_EMOJIS + i)] = data
+    return edited
+
+
+def fresh_matcher(tmp_path, emojis):
+    path = str(tmp_path / "edited.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'emojis': emojis}, f, ensure_ascii=False)
+    return EmojiMatcher(path, use_index_artifact=False)
+
+
+def test_apply_changes_matches_rebuild(matcher, database, tmp_path):
+    """An incremental update serves the same entries and search results as a rebuild"""
+    edited = edited_database(database[0], 10, 10, 10)
+    updated = matcher.apply_database(edited)
+    fresh = fresh_matcher(tmp_path, edited)
+
+    # Merged incrementally, and the original version is left untouched
+    assert updated._changes_since_fit == 30
+    assert matcher.version == 0 and len(matcher.emoji_list) == N_EMOJIS
+
+    assert updated.emoji_list == fresh.emoji_list
+    assert updated.emojis == fresh.emojis
+    assert updated.get_all_categories() == fresh.get_all_categories()
+    for category in fresh.get_all_categories():
+        assert updated.get_emoji_by_category(category) == fresh.get_emoji_by_category(category)
+    for prefix in make_prefixes(database[1], 100, seed=2) + ["zzznew"]:
+        assert (updated.search_emojis_with_count(prefix, limit=18)
+                == fresh.search_emojis_with_count(prefix, limit=18))
+
+    # Merged postings equal the entries vectorised with the kept vocabulary and IDF
+    descriptions = [' '.join(updated.emojis[emoji]['keywords']) for emoji in updated.emoji_list]
+    postings = updated.index.term_matrix().T.toarray()
+    np.testing.assert_allclose(postings, updated._vectorize_batch(descriptions).toarray(), atol=1e-6)
+    assert updated.text_to_emoji("zzznewword", top_k=1)[0] in list(edited)[:10]
+
+
+def test_apply_changes_refit_matches_rebuild(matcher, database, queries, tmp_path):
+    """Past REFIT_CHANGE_FRACTION the update refits and ranks exactly like a rebuild"""
+    edited = edited_database(database[0], 40, 20, 40)
+    updated = matcher.apply_database(edited)
+    fresh = fresh_matcher(tmp_path, edited)
+
+    assert updated._changes_since_fit == 0
+    assert updated.emoji_list == fresh.emoji_list
+    vectorizer, documents = reference_model(fresh)
+    for text in queries:
+        if not text:
+            continue
+        np.testing.assert_allclose(
+            result_scores(fresh, vectorizer, documents, text, updated.text_to_emoji(text, top_k=TOP_K)),
+            result_scores(fresh, vectorizer, documents, text, fresh.text_to_emoji(text, top_k=TOP_K)),
+            atol=1e-5)
+
+
+def test_apply_changes_without_changes_keeps_version(matcher, database):
+    """Reloading an unchanged database keeps the same matcher, and the caches keyed on it"""
+    with open(database[0], encoding='utf-8') as f:
+        emojis = json.load(f)['emojis']
+    assert matcher.apply_database(emojis) is matcher
+    emoji = matcher.emoji_list[0]
+    assert matcher.update_keywords({emoji: matcher.emojis[emoji]['keywords']}) is matcher
+    assert matcher.apply_changes(removed=["not an emoji"]) is matcher
@@ -0,0 +1,39 @@
+"""Parity of the fused canvas analysis with the original full-frame detectors.
+
+``is_circular`` is not compared: the original traced the white background
+and reported every canvas as circular.
+"""
+import cv2
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_canvas
+from utils.image_processor import ImageProcessor
+
+
+def baseline_features(gray):
+    """has_content, has_lines and is_filled as the original detectors computed them"""
+    edges = cv2.Canny(gray, 50, 150)
+    lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=50, minLineLength=30, maxLineGap=10)
+    _, binary = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY)
+    return {
+        'has_content': np.mean(gray) < 240,
+        'has_lines': lines is not None and len(lines) > 0,
+        'is_filled': np.sum(binary == 0) / gray.size > 0.1,
+    }
+
+
+@pytest.mark.parametrize("size", [200, 400])
+@pytest.mark.parametrize("density", [0.002, 0.01, 0.05, 0.2])
+def test_analyze_canvas_matches_baseline(size, density):
+    for seed in range(25):
+        canvas = make_canvas(size, density, seed)
+        features, _ = ImageProcessor.analyze_canvas(canvas)
+        expected = baseline_features(ImageProcessor.to_grayscale(canvas))
+        assert {name: features[name] for name in expected} == expected, (size, density, seed)
+
+
+def test_analyze_canvas_blank():
+    features, _ = ImageProcessor.analyze_canvas(make_canvas(400, 0.0))
+    assert features == {'has_content': False, 'is_filled': False,
+                        'is_circular': False, 'has_lines': False}
@@ -0,0 +1,74 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+import numpy as np
+
+
+def canvas_fingerprint(json_data=None, image_data=None):
+    """Return a cheap digest identifying the current drawing.
+
+    The fabric.js stroke JSON is preferred since it changes exactly when
+    the drawing does. Without it, a strided sample of the pixels is hashed.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if json_data is not None:
+        digest.update(json.dumps(json_data, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+    elif image_data is not None:
+        image_data = np.asarray(image_data)
+        digest.update(repr(image_data.shape).encode('ascii'))
+        digest.update(np.ascontiguousarray(image_data[::4, ::4]).tobytes())
+    else:
+        return None
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """Bounded LRU cache of canvas analysis results with hit/miss counters"""
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for ``key``, counting a hit.
+
+        Misses are counted by the caller with ``record_miss()`` when it
+        actually computes the value, so waiting on a pending result across
+        reruns does not skew the hit rate.
+        """
+        if key is not None and key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        return default
+
+    def record_miss(self):
+        self.misses += 1
+
+    def put(self, key, value):
+        """Store ``value`` under ``key``, evicting the least recently used entry"""
+        if key is None:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self):
+        """Return hit/miss counters and the current size"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self._entries),
+        }
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+
+
+def analyze_frame(image_data, raster_features=True, object_top_k=3,
+                  emoji_db_path="assets/emoji_database.json"):
+    """Run the CPU-heavy analysis of one canvas frame.
+
+    Returns ``(features, visual_matches, objects)``; ``features`` is None
+    when ``raster_features`` is False (the caller measured the strokes
+    instead). ``objects`` lists the separate objects of the drawing, each
+    with its own ``suggestion`` and ``emojis``, matched in one batch
+    against the database at ``emoji_db_path``.
+    Module-level so it can be shipped to a process pool, where each worker
+    builds its own shared resources on first use.
+    """
+    from utils.shared_resources import get_shared_resources
+
+    shared = get_shared_resources()
+    image_processor = shared.get_image_processor()
+    features = image_processor.analyze_drawing_features(image_data) if raster_features else None
+    gray = image_processor.to_grayscale(image_data)
+    visual_matches = shared.get_visual_matcher(emoji_db_path).rank(gray, top_k=5)
+
+    objects = image_processor.analyze_objects(gray)
+    if objects:
+        suggestions = image_processor.objects_to_text_suggestions(objects)
+        matches = shared.get_emoji_matcher(emoji_db_path).text_to_emoji_batch(
+            suggestions, top_k=object_top_k)
+        for obj, suggestion, emojis in zip(objects, suggestions, matches):
+            obj['suggestion'] = suggestion
+            obj['emojis'] = emojis
+    return features, visual_matches, objects
+
+
+class AnalysisPool:
+    """Thread or process pool for canvas analysis with per-session coalescing.
+
+    Each session has at most one queued job: submitting a newer frame
+    cancels the previous job if it has not started yet. The total number
+    of queued or running jobs is capped at ``max_queue``; beyond that new
+    frames are rejected and the caller keeps showing its last result.
+    """
+
+    def __init__(self, max_workers=2, kind='thread', max_queue=64):
+        self.max_workers = max_workers
+        self.kind = kind
+        self.max_queue = max_queue
+        if kind == 'process':
+            self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                                thread_name_prefix='canvas-analysis')
+
+        # Re-entrant: a done callback may run inside submit() / cancel()
+        self._lock = threading.RLock()
+        self._latest = {}
+        self._in_flight = 0
+        self._latencies = deque(maxlen=512)
+        self._stats = {'submitted': 0, 'completed': 0, 'failed': 0,
+                       'cancelled': 0, 'rejected': 0, 'coalesced': 0}
+
+    @classmethod
+    def from_environment(cls):
+        """Build a pool configured by EMOJI_ANALYSIS_* environment variables"""
+        return cls(
+            max_workers=int(os.environ.get('EMOJI_ANALYSIS_WORKERS', 2)),
+            kind=os.environ.get('EMOJI_ANALYSIS_POOL', 'thread'),
+            max_queue=int(os.environ.get('EMOJI_ANALYSIS_QUEUE', 64)),
+        )
+
+    def submit(self, session_id, frame_key, fn, *args, **kwargs):
+        """Queue ``fn(*args, **kwargs)`` for a session's frame; returns a Future or None if rejected"""
+        with self._lock:
+            current = self._latest.get(session_id)
+            if current is not None:
+                if current[0] == frame_key:
+                    return current[1]
+                # A newer frame supersedes the queued one
+                if current[1].cancel():
+                    self._stats['coalesced'] += 1
+
+            if self._in_flight >= self.max_queue:
+                self._stats['rejected'] += 1
+                return None
+
+            self._in_flight += 1
+            self._stats['submitted'] += 1
+            future = self._executor.submit(fn, *args, **kwargs)
+            self._latest[session_id] = (frame_key, future)
+            future.add_done_callback(partial(self._on_done, session_id, time.perf_counter()))
+            return future
+
+    def _on_done(self, session_id, submitted_at, future):
+        with self._lock:
+            self._in_flight -= 1
+            current = self._latest.get(session_id)
+            if current is not None and current[1] is future:
+                del self._latest[session_id]
+
+            if future.cancelled():
+                self._stats['cancelled'] += 1
+            elif future.exception() is not None:
+                self._stats['failed'] += 1
+            else:
+                self._stats['completed'] += 1
+                self._latencies.append(time.perf_counter() - submitted_at)
+
+    def get_stats(self):
+        """Return pool size, queue depth, job counters and latency percentiles"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(kind=self.kind, workers=self.max_workers,
+                         max_queue=self.max_queue, queue_depth=self._in_flight)
+            latencies = np.fromiter(self._latencies, dtype=np.float64)
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            stats.update(latency_p50=p50, latency_p95=p95, latency_p99=p99)
+        return stats
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,266 @@
+"""Approximate nearest-neighbour (IVF) search over the TF-IDF index.
+
+Build and evaluate from the command line, e.g. to pick ``n_probe`` for a
+large sticker catalog:
+
+    python -m utils.ann_index assets/emoji_database.json --probe 1 2 4 8 16
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+
+def _spherical_kmeans(rows, n_clusters, n_iter, rng, chunk_rows=8192):
+    """Cluster L2-normalised sparse rows by cosine similarity; returns dense centroids"""
+    from scipy import sparse
+
+    n_rows = rows.shape[0]
+    centroids = rows[rng.choice(n_rows, size=n_clusters, replace=False)].toarray()
+    for _ in range(n_iter):
+        labels = _assign(rows, centroids, chunk_rows)
+        one_hot = sparse.csr_matrix(
+            (np.ones(n_rows, dtype=np.float32), (labels, np.arange(n_rows))),
+            shape=(n_clusters, n_rows))
+        centroids = np.asarray((one_hot @ rows).todense(), dtype=np.float32)
+
+        # Reseed empty clusters from random rows
+        empty = np.flatnonzero(np.bincount(labels, minlength=n_clusters) == 0)
+        if len(empty):
+            centroids[empty] = rows[rng.choice(n_rows, size=len(empty), replace=False)].toarray()
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids /= np.maximum(norms, 1e-12)
+    return centroids
+
+
+def _assign(rows, centroids, chunk_rows=8192):
+    """Return the most similar centroid for every row, scoring in row chunks"""
+    labels = np.empty(rows.shape[0], dtype=np.int32)
+    for start in range(0, rows.shape[0], chunk_rows):
+        similarities = rows[start:start + chunk_rows] @ centroids.T
+        labels[start:start + chunk_rows] = np.asarray(similarities).argmax(axis=1)
+    return labels
+
+
+class IVFIndex:
+    """Inverted-file index: the exact postings, grouped by document cluster.
+
+    Documents are clustered with spherical k-means and every term's
+    posting list is sorted by cluster. A query scores the dense centroids,
+    picks the ``n_probe`` most similar clusters and accumulates only the
+    posting slices that fall inside them, so the work shrinks roughly by
+    ``n_probe / n_clusters`` compared to the exact index. Scores of the
+    returned documents are exact; documents in unprobed clusters are missed.
+    """
+
+    def __init__(self, centroids, indptr, doc_ids, weights, clusters, n_docs, n_probe=8):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.clusters = clusters
+        self.n_docs = int(n_docs)
+        self.n_clusters = len(self.centroids)
+        self.n_probe = n_probe
+
+    @classmethod
+    def build(cls, index, n_clusters=None, n_probe=8, n_iter=10, sample_size=None, seed=0):
+        """Cluster the documents of an ``InvertedIndex`` and regroup its postings.
+
+        Centroids are trained on a random sample of ``sample_size`` documents
+        (default 64 per cluster) and then every document is assigned once.
+        """
+        n_docs = index.n_docs
+        if n_clusters is None:
+            n_clusters = int(np.sqrt(n_docs))
+        n_clusters = max(1, min(n_clusters, n_docs))
+        rng = np.random.default_rng(seed)
+
+        rows = index.term_matrix().T.tocsr()
+        sample_size = min(n_docs, sample_size or 64 * n_clusters)
+        sample = rows[np.sort(rng.choice(n_docs, size=sample_size, replace=False))]
+        centroids = _spherical_kmeans(sample, n_clusters, n_iter, rng)
+        labels = _assign(rows, centroids)
+
+        # Sort each term's postings by (cluster, document id)
+        term_of = np.repeat(np.arange(index.n_terms), np.diff(index.indptr))
+        posting_clusters = labels[index.doc_ids]
+        order = np.lexsort((index.doc_ids, posting_clusters, term_of))
+        return cls(centroids, np.asarray(index.indptr, dtype=np.int64),
+                   np.ascontiguousarray(index.doc_ids[order]),
+                   np.ascontiguousarray(index.weights[order]),
+                   np.ascontiguousarray(posting_clusters[order]),
+                   n_docs, n_probe)
+
+    def probe(self, term_ids, term_weights, n_probe=None):
+        """Return the ids of the clusters most similar to the query"""
+        n_probe = min(n_probe or self.n_probe, self.n_clusters)
+        centroid_scores = self.centroids[:, term_ids] @ np.asarray(term_weights, dtype=np.float32)
+        if n_probe >= self.n_clusters:
+            return np.arange(self.n_clusters)
+        return np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+
+    def score(self, term_ids, term_weights, n_probe=None):
+        """Return (doc_ids, scores) for matching documents in the probed clusters"""
+        if len(term_ids) == 0:
+            return self.doc_ids[:0], self.weights[:0]
+        probed = np.sort(self.probe(term_ids, term_weights, n_probe))
+
+        id_chunks = []
+        score_chunks = []
+        for t, w in zip(term_ids, term_weights):
+            start, end = self.indptr[t], self.indptr[t + 1]
+            if start == end:
+                continue
+            # Clusters are sorted inside the posting list, so each probed
+            # cluster is one contiguous slice
+            term_clusters = self.clusters[start:end]
+            lo = start + np.searchsorted(term_clusters, probed, side='left')
+            hi = start + np.searchsorted(term_clusters, probed, side='right')
+            for a, b in zip(lo.tolist(), hi.tolist()):
+                if a < b:
+                    id_chunks.append(self.doc_ids[a:b])
+                    score_chunks.append(self.weights[a:b] * np.float32(w))
+
+        if not id_chunks:
+            return self.doc_ids[:0], self.weights[:0]
+        ids = np.concatenate(id_chunks)
+        contributions = np.concatenate(score_chunks)
+        unique_ids, inverse = np.unique(ids, return_inverse=True)
+        scores = np.bincount(inverse, weights=contributions).astype(np.float32)
+        return unique_ids, scores
+
+    def top_k(self, term_ids, term_weights, k, n_probe=None):
+        """Return the ids of the ``k`` best documents found, best first.
+
+        Uses the same ordering as ``InvertedIndex.top_k``: score, then
+        document id, then unmatched documents in id order.
+        """
+        k = min(k, self.n_docs)
+        if k <= 0:
+            return []
+
+        ids, scores = self.score(term_ids, term_weights, n_probe)
+        if len(ids) > k:
+            # Keep everything tied with the k-th score so ties resolve by id
+            kth = np.partition(-scores, k - 1)[k - 1]
+            keep = -scores <= kth
+            ids, scores = ids[keep], scores[keep]
+        order = np.lexsort((ids, -scores))[:k]
+        result = ids[order].tolist()
+
+        if len(result) < k:
+            seen = set(result)
+            for doc_id in range(self.n_docs):
+                if doc_id not in seen:
+                    result.append(doc_id)
+                    if len(result) == k:
+                        break
+        return result
+
+
+def sample_queries(matcher, n_queries, seed=0, max_keywords=3):
+    """Build realistic queries from 1..max_keywords keywords of random entries"""
+    # Entries without keywords cannot produce a query
+    candidates = np.array([emoji_id for emoji_id, record in enumerate(matcher.records)
+                           if record.keywords], dtype=np.int64)
+    if not len(candidates):
+        raise ValueError("no entries with keywords to build queries from")
+    rng = np.random.default_rng(seed)
+    queries = []
+    for emoji_id in rng.choice(candidates, size=n_queries):
+        keywords = matcher.records[emoji_id].keywords
+        n_words = int(rng.integers(1, min(max_keywords, len(keywords)) + 1))
+        picked = rng.choice(len(keywords), size=n_words, replace=False)
+        queries.append(" ".join(keywords[i] for i in picked))
+    return queries
+
+
+def evaluate_recall(matcher, queries, k=10, n_probes=(1, 2, 4, 8, 16, 32)):
+    """Compare ANN results with exact search for several ``n_probe`` settings.
+
+    A returned document counts as a hit when its exact score is positive and
+    at least the exact k-th best score, so equally scored alternatives are
+    not penalised. Returns one dict per setting with recall@k and latency
+    percentiles, plus the exact-mode latency for reference.
+    """
+    if matcher.ann_index is None:
+        raise ValueError("matcher has no ANN index; build it with search_mode='ann'")
+    vectors = [matcher._vectorize_query(query) for query in queries]
+    vectors = [(term_ids, weights) for term_ids, weights in vectors if len(term_ids)]
+    if not vectors:
+        raise ValueError("none of the queries contain an indexed term")
+
+    exact_latencies = []
+    truth = []
+    for term_ids, weights in vectors:
+        start = time.perf_counter()
+        exact = matcher.index.top_k(term_ids, weights, k)
+        exact_latencies.append(time.perf_counter() - start)
+        ids, scores = matcher.index.score(term_ids, weights)
+        exact_scores = dict(zip(ids.tolist(), scores.tolist()))
+        relevant = [doc for doc in exact if exact_scores.get(doc, 0.0) > 0]
+        threshold = exact_scores[relevant[-1]] if relevant else 0.0
+        truth.append((exact_scores, len(relevant), threshold))
+    exact_p50, exact_p99 = np.percentile(exact_latencies, [50, 99]) * 1e3
+
+    rows = []
+    for n_probe in n_probes:
+        latencies = []
+        hits = relevant_total = 0
+        for (term_ids, weights), (exact_scores, n_relevant, threshold) in zip(vectors, truth):
+            start = time.perf_counter()
+            found = matcher.ann_index.top_k(term_ids, weights, k, n_probe=n_probe)
+            latencies.append(time.perf_counter() - start)
+            # Scores are float32 sums in a different order; allow rounding
+            hits += min(n_relevant, sum(
+                1 for doc in found
+                if exact_scores.get(doc, 0.0) > 0 and exact_scores[doc] >= threshold - 1e-6))
+            relevant_total += n_relevant
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1e3
+        rows.append({
+            'n_probe': n_probe,
+            'recall': hits / relevant_total if relevant_total else 1.0,
+            'p50_ms': p50,
+            'p99_ms': p99,
+            'exact_p50_ms': exact_p50,
+            'exact_p99_ms': exact_p99,
+        })
+    return rows
+
+
+def main(argv=None):
+    from utils.emoji_matcher import EmojiMatcher
+
+    parser = argparse.ArgumentParser(description="Build an IVF index and measure recall@k against exact search")
+    parser.add_argument('db', help="emoji database JSON")
+    parser.add_argument('--clusters', type=int, default=None, help="number of clusters (default sqrt(n))")
+    parser.add_argument('--probe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32],
+                        help="n_probe settings to evaluate")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    matcher = EmojiMatcher(args.db, search_mode='ann',
+                           ann_params={'n_clusters': args.clusters, 'seed': args.seed})
+    print(f"Loaded {len(matcher.emoji_list)} entries, {matcher.ann_index.n_clusters} clusters "
+          f"in {time.perf_counter() - start:.1f} s")
+
+    try:
+        queries = sample_queries(matcher, args.queries, args.seed)
+        rows = evaluate_recall(matcher, queries, args.k, args.probe)
+    except ValueError as e:
+        print(f"Cannot measure recall: {e}")
+        return 1
+    print(f"{'n_probe':>8} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for row in rows:
+        print(f"{row['n_probe']:>8} {row['recall']:>10.3f} {row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f}")
+    print(f"{'exact':>8} {1.0:>10.3f} {rows[0]['exact_p50_ms']:>8.3f} {rows[0]['exact_p99_ms']:>8.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
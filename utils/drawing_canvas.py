@@ -1,9 +1,7 @@
 import streamlit as st
-from streamlit_drawable_canvas import st_canvas
 import numpy as np
-from PIL import Image
-import io
-import base64
+
+from utils.metrics import timed
 
 
 class DrawingCanvas:
@@ -15,8 +13,11 @@ class DrawingCanvas:
         self.stroke_color = st.session_state.get('stroke_color', "#000000")
         self.bg_color = st.session_state.get('bg_color', "#FFFFFF")
 
+    @timed('canvas.render')
     def render_canvas(self, key="canvas"):
         """Render the drawing canvas"""
+        from streamlit_drawable_canvas import st_canvas
+
         canvas_result = st_canvas(
             fill_color="rgba(255, 255, 255, 0)",
             stroke_width=self.stroke_width,
@@ -39,6 +40,8 @@ class DrawingCanvas:
     def convert_to_pil_image(self, image_data):
         """Convert canvas image data to PIL Image"""
         if image_data is not None:
+            from PIL import Image
+
             # Convert to PIL Image
             img_data = image_data.astype(np.uint8)
             pil_image = Image.fromarray(img_data)
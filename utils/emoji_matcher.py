@@ -1,21 +1,154 @@
+import copy
+import itertools
 import json
+import re
+import sys
 import numpy as np
-from sklearn.neighbors import NearestNeighbors
-from sklearn.feature_extraction.text import TfidfVectorizer
 import os
 
+from utils.index_artifact import (default_index_path, file_sha256,
+                                  load_index_artifact, write_index_artifact)
+from utils.inverted_index import InvertedIndex
+from utils.metrics import get_metrics, timed
+from utils.search_index import KeywordSearchIndex
+
+
+class EmojiRecord:
+    """Compact, read-only metadata for one emoji.
+
+    Supports ``record['keywords']`` / ``record['category']`` so it can be
+    used wherever the raw database dict was used before.
+    """
+    __slots__ = ('emoji', 'emoji_id', 'keywords', 'category')
+
+    def __init__(self, emoji, emoji_id, keywords, category):
+        self.emoji = emoji
+        self.emoji_id = emoji_id
+        self.keywords = keywords
+        self.category = category
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def __repr__(self):
+        return f"EmojiRecord({self.emoji!r}, keywords={self.keywords!r}, category={self.category!r})"
+
+
+UNKNOWN_EMOJI = EmojiRecord(None, -1, (), "unknown")
+
+# scikit-learn's default token_pattern. Its English stop words never reach
+# the fitted vocabulary, so dropping unknown tokens also drops stop words.
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
 
 class EmojiMatcher:
-    def __init__(self, emoji_db_path="assets/emoji_database.json"):
+    VECTORIZER_PARAMS = {'stop_words': 'english', 'max_features': 1000}
+    # Share of entries that may change incrementally before a full refit
+    REFIT_CHANGE_FRACTION = 0.1
+
+    def __init__(self, emoji_db_path="assets/emoji_database.json", index_path=None,
+                 use_index_artifact=True, search_mode='exact', ann_params=None):
         self.emoji_db_path = emoji_db_path
+        self.index_path = index_path or default_index_path(emoji_db_path)
         self.emojis = {}
         self.categories = set()
-        self.vectorizer = None
-        self.knn_model = None
-        self.feature_vectors = None
-        self._load_emoji_database()
-        self._train_model()
+        self._vectorizer = None
+        self.index = None
+        self.ann_index = None
+        self._feature_vectors = None
+        self._vocabulary = {}
+        self._idf = np.zeros(0, dtype=np.float32)
+        self.emoji_list = []
+        self.search_index = None
+        self.records = []
+        self._records_by_emoji = {}
+        self._sorted_categories = []
+        self._category_emoji_ids = {}
+        self._category_emojis = {}
+        self.loaded_from_artifact = False
+        self.version = 0
+        self._changes_since_fit = 0
+        self._ann_params = None
+
+        # Prefer the precompiled index; fall back to parsing and fitting the JSON
+        if use_index_artifact and self._load_index_artifact():
+            self.loaded_from_artifact = True
+        else:
+            self._load_emoji_database()
+            self._train_model()
+        self._build_lookup_tables()
+
+        if search_mode == 'ann':
+            self.enable_ann(**(ann_params or {}))
+        elif search_mode != 'exact':
+            raise ValueError(f"unknown search_mode {search_mode!r}; use 'exact' or 'ann'")
+
+    @timed('matcher.load_artifact')
+    def _load_index_artifact(self):
+        """Load the memory-mapped index artifact if it matches the database"""
+        try:
+            source_hash = file_sha256(self.emoji_db_path)
+        except OSError:
+            return False
+
+        loaded = load_index_artifact(self.index_path, source_hash)
+        if loaded is None:
+            return False
+        header, arrays = loaded
+        if header['vectorizer'] != self.VECTORIZER_PARAMS:
+            return False
+
+        self.emojis = header['emojis']
+        self.emoji_list = header['emoji_list']
+        self.categories = set(emoji_data['category'] for emoji_data in self.emojis.values())
 
+        self.index = InvertedIndex(arrays['indptr'], arrays['doc_ids'], arrays['weights'],
+                                   header['n_docs'])
+        self._vocabulary = {term: term_id for term_id, term in enumerate(header['vocabulary'])}
+        self._idf = arrays['idf']
+        return True
+
+    @property
+    def vectorizer(self):
+        """The fitted scikit-learn TfidfVectorizer, rebuilt on first use after an artifact load.
+
+        Queries never need it; it is kept for callers that want sklearn's API.
+        """
+        if self._vectorizer is None and self.index is not None:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+
+            vectorizer = TfidfVectorizer(vocabulary=self._vocabulary, dtype=np.float32,
+                                         **self.VECTORIZER_PARAMS)
+            vectorizer.idf_ = np.asarray(self._idf)
+            self._vectorizer = vectorizer
+        return self._vectorizer
+
+    @property
+    def feature_vectors(self):
+        """The (emojis x terms) TF-IDF matrix, built from the index on first use"""
+        if self._feature_vectors is None and self.index is not None:
+            self._feature_vectors = self.index.term_matrix().T
+        return self._feature_vectors
+
+    def save_index(self, index_path=None):
+        """Compile the current index into a memory-mappable artifact"""
+        write_index_artifact(
+            index_path or self.index_path,
+            file_sha256(self.emoji_db_path),
+            self.emojis,
+            self.emoji_list,
+            self._vocabulary,
+            self._idf,
+            self.index,
+            self.VECTORIZER_PARAMS,
+        )
+
+    @timed('matcher.load_json')
     def _load_emoji_database(self):
         """Load emoji database from JSON file"""
         try:
@@ -30,8 +163,9 @@ class EmojiMatcher:
             print(f"Emoji database not found at {self.emoji_db_path}")
             self.emojis = {}
 
+    @timed('matcher.fit')
     def _train_model(self):
-        """Train the KNN model for emoji matching"""
+        """Build the TF-IDF vectors and the inverted index for emoji matching"""
         if not self.emojis:
             return
 
@@ -44,45 +178,356 @@ class EmojiMatcher:
             emoji_descriptions.append(description)
             self.emoji_list.append(emoji)
 
-        # Create TF-IDF vectors
-        self.vectorizer = TfidfVectorizer(stop_words='english', max_features=1000)
-        self.feature_vectors = self.vectorizer.fit_transform(emoji_descriptions).toarray()
+        # scikit-learn is only needed for fitting, not for answering queries
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        # Create sparse TF-IDF vectors (rows are L2-normalised)
+        self._vectorizer = TfidfVectorizer(dtype=np.float32, **self.VECTORIZER_PARAMS)
+        self._feature_vectors = self._vectorizer.fit_transform(emoji_descriptions)
+
+        # Build term -> posting-list index for cosine scoring
+        self.index = InvertedIndex.from_csr(self._feature_vectors)
+        self._vocabulary = self._vectorizer.vocabulary_
+        self._idf = self._vectorizer.idf_.astype(np.float32)
+
+    @property
+    def search_mode(self):
+        return 'ann' if self.ann_index is not None else 'exact'
+
+    @timed('matcher.build_ann')
+    def enable_ann(self, n_clusters=None, n_probe=8, n_iter=10, seed=0):
+        """Answer queries from an approximate IVF index instead of exact search.
+
+        ``n_clusters`` (default sqrt of the number of entries) and
+        ``n_probe`` trade recall for latency; ``python -m utils.ann_index``
+        measures recall@k for a database.
+        """
+        if self.index is None:
+            return
+        from utils.ann_index import IVFIndex
+
+        self.ann_index = IVFIndex.build(self.index, n_clusters, n_probe, n_iter, seed=seed)
+        self._ann_params = {'n_clusters': n_clusters, 'n_probe': n_probe,
+                            'n_iter': n_iter, 'seed': seed}
+
+    def disable_ann(self):
+        """Go back to exact search"""
+        self.ann_index = None
+        self._ann_params = None
+
+    def add_emojis(self, entries):
+        """Return a new matcher version with ``{emoji: {'keywords', 'category'}}`` entries added"""
+        return self.apply_changes(added=entries)
+
+    def remove_emojis(self, emojis):
+        """Return a new matcher version without ``emojis``"""
+        return self.apply_changes(removed=emojis)
+
+    def update_keywords(self, keywords_by_emoji):
+        """Return a new matcher version with new keywords for existing emojis"""
+        updated = {emoji: dict(self.emojis[emoji], keywords=list(keywords))
+                   for emoji, keywords in keywords_by_emoji.items() if emoji in self.emojis}
+        return self.apply_changes(updated=updated)
+
+    def apply_database(self, emojis):
+        """Return a new matcher version for a reloaded database's ``emojis`` mapping"""
+        added = {emoji: data for emoji, data in emojis.items() if emoji not in self.emojis}
+        removed = [emoji for emoji in self.emojis if emoji not in emojis]
+        updated = {emoji: data for emoji, data in emojis.items()
+                   if emoji in self.emojis and self.emojis[emoji] != data}
+        return self.apply_changes(added, removed, updated)
 
-        # Train KNN model
-        self.knn_model = NearestNeighbors(n_neighbors=5, metric='cosine')
-        self.knn_model.fit(self.feature_vectors)
+    @timed('matcher.apply_changes')
+    def apply_changes(self, added=None, removed=None, updated=None):
+        """Return a new matcher version with entries added, removed or updated.
 
+        This matcher is left untouched, so queries running against it are
+        never blocked and never see a half-applied change. Vectors of the
+        changed entries use the current IDF weights and are merged into a
+        copy of the postings. Once more than REFIT_CHANGE_FRACTION of the
+        entries changed since the last fit, the vocabulary and IDF are
+        refit from scratch instead. When nothing actually changes, this
+        matcher is returned as is, so caches keyed on it stay valid.
+        """
+        removed = {emoji for emoji in (removed or ()) if emoji in self.emojis}
+        added = {emoji: data for emoji, data in (added or {}).items() if emoji not in self.emojis}
+        updated = {emoji: data for emoji, data in (updated or {}).items()
+                   if emoji in self.emojis and emoji not in removed and self.emojis[emoji] != data}
+        if not (added or removed or updated):
+            return self
+
+        new = copy.copy(self)
+        new.version = self.version + 1
+        new.loaded_from_artifact = False
+        new._vectorizer = None
+        new._feature_vectors = None
+        new.ann_index = None
+        new.emoji_list = [emoji for emoji in self.emoji_list if emoji not in removed] + list(added)
+        new.emojis = {emoji: updated.get(emoji) or added.get(emoji) or self.emojis[emoji]
+                      for emoji in new.emoji_list}
+        new.categories = set(emoji_data['category'] for emoji_data in new.emojis.values())
+        new._changes_since_fit = self._changes_since_fit + len(added) + len(removed) + len(updated)
+
+        if (self.index is None
+                or new._changes_since_fit > self.REFIT_CHANGE_FRACTION * len(new.emoji_list)):
+            new.index = None
+            new._train_model()
+            new._changes_since_fit = 0
+            new._build_lookup_tables()
+        else:
+            new._merge_changes(self, added, updated)
+            new._build_lookup_tables(previous=self)
+        if self._ann_params is not None and new.index is not None:
+            new.enable_ann(**self._ann_params)
+        return new
+
+    def _merge_changes(self, old, added, updated):
+        """Merge added and updated entries into copies of ``old``'s postings and search index"""
+        # Keeps stop words out of the vocabulary, as fitting does; queries rely on it
+        from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+        old_ids = {emoji: emoji_id for emoji_id, emoji in enumerate(old.emoji_list)}
+        new_ids = {emoji: emoji_id for emoji_id, emoji in enumerate(self.emoji_list)}
+        doc_map = np.full(len(old.emoji_list), -1, dtype=np.int64)
+        for emoji, emoji_id in new_ids.items():
+            if emoji in old_ids:
+                doc_map[old_ids[emoji]] = emoji_id
+
+        vocabulary = dict(old._vocabulary)
+        n_old_terms = len(vocabulary)
+        new_term_df = {}
+        documents = []
+        for emoji in itertools.chain(updated, added):
+            counts = {}
+            for token in TOKEN_PATTERN.findall(' '.join(self.emojis[emoji]['keywords']).lower()):
+                if token in ENGLISH_STOP_WORDS:
+                    continue
+                term_id = vocabulary.setdefault(token, len(vocabulary))
+                counts[term_id] = counts.get(term_id, 0) + 1
+            for term_id in counts:
+                if term_id >= n_old_terms:
+                    new_term_df[term_id] = new_term_df.get(term_id, 0) + 1
+            documents.append((new_ids[emoji], counts))
+
+        # Smoothed IDF as in fitting; new terms only occur in the changed entries
+        idf = np.concatenate([old._idf, np.zeros(len(vocabulary) - n_old_terms, dtype=np.float32)])
+        n_docs = len(self.emoji_list)
+        for term_id, df in new_term_df.items():
+            idf[term_id] = np.log((1 + n_docs) / (1 + df)) + 1
+
+        doc_ids, term_ids, weights = [], [], []
+        for emoji_id, counts in documents:
+            ids = list(counts)
+            w = np.fromiter(counts.values(), dtype=np.float32, count=len(ids)) * idf[ids]
+            norm = np.linalg.norm(w)
+            if norm == 0:
+                continue
+            doc_ids.extend([emoji_id] * len(ids))
+            term_ids.extend(ids)
+            weights.append(w / norm)
+
+        replaced = np.array([old_ids[emoji] for emoji in updated], dtype=np.int64)
+        self.index = old.index.with_changes(
+            doc_map, replaced, doc_ids, term_ids,
+            np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32),
+            n_docs, len(vocabulary))
+        self._vocabulary = vocabulary
+        self._idf = idf
+        self.search_index = old.search_index.with_changes(
+            doc_map, replaced,
+            [(new_ids[emoji], self.emojis[emoji]['keywords']) for emoji in itertools.chain(updated, added)],
+            n_docs)
+
+    @timed('matcher.lookup_tables')
+    def _build_lookup_tables(self, previous=None):
+        """Build per-emoji records, category tables and the keyword search index.
+
+        After an incremental change, ``previous`` is the matcher it was
+        applied to: records of unchanged entries are reused and the search
+        index, already updated by ``_merge_changes``, is kept.
+        """
+        if not self.emoji_list:
+            self.emoji_list = list(self.emojis)
+
+        previous_emojis = previous.emojis if previous is not None else {}
+        previous_records = previous._records_by_emoji if previous is not None else {}
+        self.records = []
+        category_ids = {}
+        for emoji_id, emoji in enumerate(self.emoji_list):
+            data = self.emojis[emoji]
+            record = previous_records.get(emoji)
+            if record is None or previous_emojis[emoji] is not data:
+                category = sys.intern(data['category'])
+                keywords = tuple(sys.intern(keyword) for keyword in data['keywords'])
+                record = EmojiRecord(emoji, emoji_id, keywords, category)
+            elif record.emoji_id != emoji_id:
+                record = EmojiRecord(emoji, emoji_id, record.keywords, record.category)
+            self.records.append(record)
+            category_ids.setdefault(record.category, []).append(emoji_id)
+        self._records_by_emoji = {record.emoji: record for record in self.records}
+
+        self._sorted_categories = sorted(category_ids)
+        self._category_emoji_ids = {category: np.asarray(ids, dtype=np.int32)
+                                    for category, ids in category_ids.items()}
+        self._category_emojis = {category: tuple(self.emoji_list[i] for i in ids)
+                                 for category, ids in category_ids.items()}
+
+        if previous is None:
+            self.search_index = KeywordSearchIndex([record.keywords for record in self.records])
+
+    def canonical_query(self, text):
+        """Return a hashable form of ``text`` keeping only what scoring depends on.
+
+        Case, whitespace, punctuation, stop words, unknown words and word
+        order do not change the query vector, so equivalent texts map to the
+        same sorted tuple of term ids (repeated terms are kept).
+        """
+        term_ids = []
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            term_id = self._vocabulary.get(token)
+            if term_id is not None:
+                term_ids.append(term_id)
+        return tuple(sorted(term_ids))
+
+    def _vectorize_query(self, text):
+        """Return (term_ids, weights) of the L2-normalised TF-IDF query vector"""
+        counts = {}
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            term_id = self._vocabulary.get(token)
+            if term_id is not None:
+                counts[term_id] = counts.get(term_id, 0) + 1
+
+        if not counts:
+            return [], np.zeros(0, dtype=np.float32)
+
+        term_ids = list(counts)
+        weights = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        weights *= self._idf[term_ids]
+        weights /= np.linalg.norm(weights)
+        return term_ids, weights
+
+    def _vectorize_batch(self, texts):
+        """Return a (texts x terms) CSR matrix of L2-normalised TF-IDF query vectors"""
+        from scipy import sparse
+
+        rows, term_ids = [], []
+        vocabulary = self._vocabulary
+        for row, text in enumerate(texts):
+            if not text:
+                continue
+            for token in TOKEN_PATTERN.findall(text.lower()):
+                term_id = vocabulary.get(token)
+                if term_id is not None:
+                    rows.append(row)
+                    term_ids.append(term_id)
+
+        # Duplicate (row, term) pairs are summed into term counts
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, term_ids)),
+            shape=(len(texts), len(self._idf)), dtype=np.float32)
+        matrix.sum_duplicates()
+        matrix.data *= self._idf[matrix.indices]
+        row_of = np.repeat(np.arange(len(texts)), np.diff(matrix.indptr))
+        norms = np.sqrt(np.bincount(row_of, weights=matrix.data * matrix.data,
+                                    minlength=len(texts))).astype(np.float32)
+        matrix.data /= norms[row_of]
+        return matrix
+
+    @timed('matcher.text_to_emoji')
     def text_to_emoji(self, text, top_k=5):
         """Convert text to matching emojis"""
-        if not text or not self.knn_model:
+        if not text or self.index is None:
             return ["❓"] * top_k
 
         # Transform input text
-        text_vector = self.vectorizer.transform([text]).toarray()
+        term_ids, weights = self._vectorize_query(text)
 
-        # Find nearest neighbors
-        distances, indices = self.knn_model.kneighbors(text_vector, n_neighbors=top_k)
+        # Score only the postings of the query terms
+        index = self.ann_index if self.ann_index is not None else self.index
+        indices = index.top_k(term_ids, weights, top_k)
 
         # Get matching emojis
-        matching_emojis = [self.emoji_list[i] for i in indices[0]]
+        matching_emojis = [self.emoji_list[i] for i in indices]
         return matching_emojis
 
+    def text_to_emoji_batch(self, texts, top_k=5, chunk_size=None,
+                            max_chunk_bytes=64 * 1024 * 1024, stream=False):
+        """Convert many texts to matching emojis at once.
+
+        Texts are vectorised and scored chunk by chunk with one sparse matrix
+        product per chunk. The chunk size is capped so the dense score block
+        stays under ``max_chunk_bytes``. ``texts`` may be any iterable; with
+        ``stream=True`` a generator yielding one result list per text is
+        returned so arbitrarily large inputs can be processed lazily.
+        """
+        results = self._iter_text_to_emoji_batch(texts, top_k, chunk_size, max_chunk_bytes)
+        if stream:
+            return results
+        return list(results)
+
+    def _iter_text_to_emoji_batch(self, texts, top_k, chunk_size, max_chunk_bytes):
+        """Yield text_to_emoji results for each text, scoring in bounded chunks"""
+        if self.index is None:
+            for _ in texts:
+                yield ["❓"] * top_k
+            return
+        if self.ann_index is not None:
+            # The IVF index answers one query at a time
+            for text in texts:
+                yield self.text_to_emoji(text, top_k)
+            return
+
+        # Worst case every emoji scores: float32 value + int32 column + int32 rank key
+        bytes_per_row = max(1, self.index.n_docs) * 12
+        memory_rows = max(1, max_chunk_bytes // bytes_per_row)
+        rows = min(chunk_size, memory_rows) if chunk_size else memory_rows
+
+        iterator = iter(texts)
+        while True:
+            chunk = list(itertools.islice(iterator, rows))
+            if not chunk:
+                return
+
+            with get_metrics().timer('matcher.text_to_emoji_batch_chunk'):
+                query_matrix = self._vectorize_batch(chunk)
+                indices = self.index.top_k_batch(query_matrix, top_k)
+            for text, row in zip(chunk, indices):
+                if not text:
+                    yield ["❓"] * top_k
+                else:
+                    yield [self.emoji_list[i] for i in row]
+
     def get_emoji_by_category(self, category):
         """Get all emojis in a specific category"""
-        return [emoji for emoji, data in self.emojis.items() if data['category'] == category]
+        return list(self._category_emojis.get(category, ()))
+
+    def get_emoji_ids_by_category(self, category):
+        """Get the emoji ids (positions in ``emoji_list``) of a category"""
+        return self._category_emoji_ids.get(category, np.zeros(0, dtype=np.int32))
 
     def get_emoji_info(self, emoji):
         """Get information about a specific emoji"""
-        return self.emojis.get(emoji, {"keywords": [], "category": "unknown"})
+        return self._records_by_emoji.get(emoji, UNKNOWN_EMOJI)
 
-    def search_emojis(self, query):
-        """Search emojis by keyword"""
-        matching_emojis = []
-        for emoji, data in self.emojis.items():
-            if any(query.lower() in keyword.lower() for keyword in data['keywords']):
-                matching_emojis.append(emoji)
-        return matching_emojis
+    def get_emoji_info_many(self, emojis):
+        """Get information about several emojis at once"""
+        lookup = self._records_by_emoji.get
+        return [lookup(emoji, UNKNOWN_EMOJI) for emoji in emojis]
+
+    def search_emojis(self, query, limit=None, offset=0):
+        """Search emojis by keyword, best matches first"""
+        return self.search_emojis_with_count(query, limit, offset)[0]
+
+    @timed('matcher.search')
+    def search_emojis_with_count(self, query, limit=None, offset=0):
+        """Return up to ``limit`` ranked matches after ``offset`` and the total number of matches.
+
+        Exact keyword matches rank first, then keyword prefixes, word
+        prefixes inside multi-word keywords and finally plain substrings.
+        """
+        ids, total = self.search_index.search(query, limit, offset)
+        return [self.emoji_list[i] for i in ids], total
 
     def get_all_categories(self):
         """Get all available categories"""
-        return sorted(self.categories)
\ No newline at end of file
+        return list(self._sorted_categories)
\ No newline at end of file
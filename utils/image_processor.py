@@ -1,66 +1,289 @@
 import cv2
 import numpy as np
-from PIL import Image
-import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.metrics import get_metrics
 
 
 class ImageProcessor:
+    INK_THRESHOLD = 127  # Pixels at or below this gray level count as ink
+    CROP_PADDING = 3  # Keeps Canny's 3x3 Sobel window identical at the crop border
+    MIN_CONTOUR_AREA = 100
+    MIN_LINE_LENGTH = 30
+    MERGE_DISTANCE = 12  # Strokes closer than this many pixels belong to one object
+    MIN_OBJECT_PIXELS = 30  # Smaller ink specks are not reported as objects
+    OBJECT_FILL_RATIO = 0.5  # Share of its bounding box an object must cover to count as filled
+    MAX_RADIAL_SPREAD = 0.06  # Relative spread of boundary distances from the centre of a round shape
+    PARALLEL_MIN_PIXELS = 256 * 256  # Objects of larger canvases are analyzed in parallel
+    REGION_WORKERS = 4
+
+    _region_executor = None
+    _region_executor_lock = threading.Lock()
+
     @staticmethod
     def analyze_drawing_features(image_array):
         """Analyze basic features of the drawing (simplified version)"""
         if image_array is None:
             return {}
+        features, _ = ImageProcessor.analyze_canvas(image_array)
+        return features
 
-        # Convert to grayscale if needed
-        if len(image_array.shape) == 3:
-            gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = image_array
+    @staticmethod
+    def to_grayscale(image_array):
+        """Convert a gray, RGB or RGBA array to uint8 grayscale.
+
+        Transparent RGBA pixels are composited over white, which is what an
+        untouched canvas looks like to the user.
+        """
+        image_array = np.asarray(image_array)
+        if image_array.dtype != np.uint8:
+            image_array = image_array.astype(np.uint8)
+        if image_array.ndim == 2:
+            return image_array
+
+        channels = image_array.shape[2]
+        if channels == 1:
+            return image_array[..., 0]
+        if channels == 3:
+            return cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
+
+        gray = cv2.cvtColor(image_array, cv2.COLOR_RGBA2GRAY)
+        alpha = image_array[..., 3]
+        if cv2.minMaxLoc(alpha)[0] < 255:
+            # gray * a + 255 * (1 - a), with a = alpha / 255
+            white = cv2.bitwise_not(alpha)
+            gray = cv2.add(cv2.multiply(gray, alpha, scale=1 / 255.0), white)
+        return gray
+
+    @staticmethod
+    def analyze_canvas(image_array, max_side=None):
+        """Analyze a canvas frame in one pass, returning (features, timings).
+
+        The frame is converted to grayscale and binarized once, then
+        contour and edge detection run only on the bounding box of the
+        drawn pixels. With ``max_side`` set, larger frames are downscaled
+        first and the pixel thresholds are scaled to match. ``timings``
+        maps each stage to its duration in seconds.
+        """
+        features, timings = ImageProcessor._analyze_canvas(image_array, max_side)
+        metrics = get_metrics()
+        if metrics.enabled:
+            for stage, seconds in timings.items():
+                metrics.observe('image.' + stage, seconds)
+        return features, timings
+
+    @staticmethod
+    def _scaled_grayscale(image_array, max_side):
+        """Return (gray, scale): the grayscale frame, downscaled to ``max_side`` if larger"""
+        gray = ImageProcessor.to_grayscale(image_array)
+        scale = 1.0
+        if max_side and max(gray.shape) > max_side:
+            scale = max_side / max(gray.shape)
+            size = (max(1, round(gray.shape[1] * scale)), max(1, round(gray.shape[0] * scale)))
+            gray = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+        return gray, scale
+
+    @staticmethod
+    def _analyze_canvas(image_array, max_side):
+        timings = {}
+        start = time.perf_counter()
+
+        gray, scale = ImageProcessor._scaled_grayscale(image_array, max_side)
+        now = time.perf_counter()
+        timings['grayscale'], start = now - start, now
+
+        # Ink is foreground (255) in the mask
+        _, ink = cv2.threshold(gray, ImageProcessor.INK_THRESHOLD, 255, cv2.THRESH_BINARY_INV)
+        ink_pixels = cv2.countNonZero(ink)
+        now = time.perf_counter()
+        timings['binarize'], start = now - start, now
 
-        # Basic image analysis
         features = {}
+        features['has_content'] = cv2.mean(gray)[0] < 240  # Assuming white background
+        features['is_filled'] = ImageProcessor._detect_filled_area(ink_pixels, gray.size)
 
-        # Check if image has content (not empty)
-        features['has_content'] = np.mean(gray) < 240  # Assuming white background
+        # Crop to everything that is not pure background, so faint strokes
+        # still reach the edge detector
+        _, drawn = cv2.threshold(gray, 254, 255, cv2.THRESH_BINARY_INV)
+        x, y, w, h = cv2.boundingRect(drawn)
+        if w == 0 or h == 0:
+            features['is_circular'] = False
+            features['has_lines'] = False
+            timings['crop'] = time.perf_counter() - start
+            timings['contours'] = timings['lines'] = 0.0
+            return features, timings
 
-        # Detect shapes (simplified)
-        features['is_circular'] = ImageProcessor._detect_circularity(gray)
-        features['has_lines'] = ImageProcessor._detect_lines(gray)
-        features['is_filled'] = ImageProcessor._detect_filled_area(gray)
+        pad = ImageProcessor.CROP_PADDING
+        x0, y0 = max(0, x - pad), max(0, y - pad)
+        x1, y1 = min(gray.shape[1], x + w + pad), min(gray.shape[0], y + h + pad)
+        gray_crop = gray[y0:y1, x0:x1]
+        ink_crop = ink[y0:y1, x0:x1]
+        now = time.perf_counter()
+        timings['crop'], start = now - start, now
 
-        return features
+        features['is_circular'] = ImageProcessor._detect_circularity(
+            ink_crop, ImageProcessor.MIN_CONTOUR_AREA * scale * scale)
+        now = time.perf_counter()
+        timings['contours'], start = now - start, now
+
+        # Canny on the padded crop matches the full frame's edges exactly, but
+        # HoughLinesP samples points in a coordinate-dependent order, so the
+        # edges are placed back at their position in a full-size edge map
+        edges = np.zeros_like(gray)
+        edges[y0:y1, x0:x1] = cv2.Canny(gray_crop, 50, 150)
+        features['has_lines'] = ImageProcessor._has_lines(
+            edges, max(1, round(ImageProcessor.MIN_LINE_LENGTH * scale)))
+        timings['lines'] = time.perf_counter() - start
+
+        return features, timings
 
     @staticmethod
-    def _detect_circularity(gray_image):
+    def analyze_objects(image_array, max_side=None):
+        """Split the drawing into separate objects and analyze each one.
+
+        Ink closer than MERGE_DISTANCE pixels is grouped into one object
+        (so a face keeps its eyes) by labelling the connected components
+        of the dilated ink mask. Contour shape statistics of all objects
+        come from one vectorized pass; line detection runs per object, in
+        parallel on large canvases. Returns one dict per object, largest
+        first, with ``bbox`` (x, y, w, h in input pixels), ``ink_pixels``,
+        ``is_circular``, ``has_lines`` and ``is_filled``.
+        """
+        gray, scale = ImageProcessor._scaled_grayscale(image_array, max_side)
+        _, ink = cv2.threshold(gray, ImageProcessor.INK_THRESHOLD, 255, cv2.THRESH_BINARY_INV)
+        if cv2.countNonZero(ink) == 0:
+            return []
+
+        # Both neighbours grow by half the distance, so gaps up to it close
+        radius = max(1, round(ImageProcessor.MERGE_DISTANCE * scale / 2))
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1))
+        n_labels, labels, stats, _ = cv2.connectedComponentsWithStats(
+            cv2.dilate(ink, kernel), connectivity=8)
+        ink_pixels = np.bincount(labels[ink > 0], minlength=n_labels)
+
+        # Shape statistics of every contour at once, then the best one per
+        # object. Every boundary pixel is kept so the radial spread is not
+        # biased towards corners; area and perimeter are the same either way.
+        contours, _ = cv2.findContours(ink, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+        areas, perimeters, spreads, anchors = ImageProcessor._contour_stats(contours)
+        owners = labels[anchors[:, 1], anchors[:, 0]]
+        # Squares and houses pass the circularity test alone
+        round_enough = ((areas > ImageProcessor.MIN_CONTOUR_AREA * scale * scale)
+                        & (ImageProcessor._circularity(areas, perimeters) > 0.7)
+                        & (spreads < ImageProcessor.MAX_RADIAL_SPREAD))
+        is_circular = np.zeros(n_labels, dtype=bool)
+        is_circular[owners[round_enough]] = True
+
+        kept = np.flatnonzero(ink_pixels[1:] >= ImageProcessor.MIN_OBJECT_PIXELS * scale * scale) + 1
+        kept = kept[np.argsort(-ink_pixels[kept], kind='stable')]
+        min_line_length = max(1, round(ImageProcessor.MIN_LINE_LENGTH * scale))
+        jobs = [(gray, ink, labels, int(label), stats[label, :4], min_line_length) for label in kept]
+        if len(jobs) > 1 and gray.size >= ImageProcessor.PARALLEL_MIN_PIXELS:
+            regions = list(ImageProcessor._get_region_executor().map(
+                lambda job: ImageProcessor._analyze_region(*job), jobs))
+        else:
+            regions = [ImageProcessor._analyze_region(*job) for job in jobs]
+
+        objects = []
+        for label, (bbox, has_lines, fill_ratio) in zip(kept, regions):
+            objects.append({
+                'bbox': tuple(int(round(v / scale)) for v in bbox),
+                'ink_pixels': int(round(ink_pixels[label] / (scale * scale))),
+                'is_circular': bool(is_circular[label]),
+                'has_lines': has_lines,
+                'is_filled': fill_ratio > ImageProcessor.OBJECT_FILL_RATIO,
+            })
+        return objects
+
+    @staticmethod
+    def _analyze_region(gray, ink, labels, label, box, min_line_length):
+        """Return (ink bbox, has_lines, fill ratio) for one labelled object"""
+        x, y, w, h = (int(v) for v in box)
+        region = labels[y:y + h, x:x + w] == label
+        ink_region = cv2.bitwise_and(ink[y:y + h, x:x + w], region.view(np.uint8) * np.uint8(255))
+        bx, by, bw, bh = cv2.boundingRect(ink_region)
+        # Other objects inside the box are painted out as background
+        gray_region = np.where(region, gray[y:y + h, x:x + w], np.uint8(255))
+        has_lines = ImageProcessor._detect_lines(gray_region, min_line_length)
+        fill_ratio = cv2.countNonZero(ink_region) / float(bw * bh) if bw and bh else 0.0
+        return (x + bx, y + by, bw, bh), has_lines, fill_ratio
+
+    @classmethod
+    def _get_region_executor(cls):
+        if cls._region_executor is None:
+            with cls._region_executor_lock:
+                if cls._region_executor is None:
+                    cls._region_executor = ThreadPoolExecutor(
+                        max_workers=cls.REGION_WORKERS, thread_name_prefix='canvas-regions')
+        return cls._region_executor
+
+    @staticmethod
+    def _contour_stats(contours):
+        """Return (areas, perimeters, radial spreads, first points) of closed contours, all in one pass.
+
+        The radial spread is the coefficient of variation of the vertices'
+        distances from the contour's mean vertex: about 0 for circles.
+        """
+        if not contours:
+            return np.zeros(0), np.zeros(0), np.zeros(0), np.zeros((0, 2), dtype=np.int64)
+        lengths = np.fromiter((len(contour) for contour in contours), dtype=np.int64, count=len(contours))
+        points = np.concatenate(contours).reshape(-1, 2)
+        starts = np.zeros(len(contours), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=starts[1:])
+
+        # Index of the next vertex, wrapping around inside each contour
+        successor = np.arange(1, len(points) + 1)
+        successor[starts + lengths - 1] = starts
+        x = points[:, 0].astype(np.float64)
+        y = points[:, 1].astype(np.float64)
+        cross = x * y[successor] - x[successor] * y
+        areas = 0.5 * np.abs(np.add.reduceat(cross, starts))
+        perimeters = np.add.reduceat(np.hypot(x[successor] - x, y[successor] - y), starts)
+
+        centre_x = np.repeat(np.add.reduceat(x, starts) / lengths, lengths)
+        centre_y = np.repeat(np.add.reduceat(y, starts) / lengths, lengths)
+        distances = np.hypot(x - centre_x, y - centre_y)
+        mean = np.add.reduceat(distances, starts) / lengths
+        variance = np.add.reduceat(distances * distances, starts) / lengths - mean * mean
+        spreads = np.ones(len(contours))
+        np.divide(np.sqrt(np.maximum(variance, 0.0)), mean, out=spreads, where=mean > 0)
+        return areas, perimeters, spreads, points[starts].astype(np.int64)
+
+    @staticmethod
+    def _circularity(areas, perimeters):
+        """4*pi*area / perimeter^2, 1.0 for a perfect circle and 0 for degenerate contours"""
+        circularity = np.zeros(len(areas))
+        np.divide(4 * np.pi * areas, perimeters * perimeters, out=circularity, where=perimeters > 0)
+        return circularity
+
+    @staticmethod
+    def _detect_circularity(ink_mask, min_area=100):
         """Detect if the drawing contains circular shapes"""
-        # Simple circularity detection
-        _, binary = cv2.threshold(gray_image, 127, 255, cv2.THRESH_BINARY)
-        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if area > 100:  # Minimum area threshold
-                perimeter = cv2.arcLength(contour, True)
-                if perimeter > 0:
-                    circularity = 4 * np.pi * area / (perimeter * perimeter)
-                    if circularity > 0.7:  # Close to circle
-                        return True
-        return False
+        if cv2.countNonZero(ink_mask) == 0:
+            return False
+        contours, _ = cv2.findContours(ink_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        areas, perimeters, _, _ = ImageProcessor._contour_stats(contours)
+        # Close to a circle and above the minimum area
+        return bool(np.any((areas > min_area) & (ImageProcessor._circularity(areas, perimeters) > 0.7)))
 
     @staticmethod
-    def _detect_lines(gray_image):
+    def _detect_lines(gray_image, min_line_length=30):
         """Detect if the drawing contains straight lines"""
-        edges = cv2.Canny(gray_image, 50, 150)
-        lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=50, minLineLength=30, maxLineGap=10)
+        return ImageProcessor._has_lines(cv2.Canny(gray_image, 50, 150), min_line_length)
+
+    @staticmethod
+    def _has_lines(edges, min_line_length=30):
+        """Detect straight lines in a Canny edge map"""
+        lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=50,
+                                minLineLength=min_line_length, maxLineGap=10)
         return lines is not None and len(lines) > 0
 
     @staticmethod
-    def _detect_filled_area(gray_image):
+    def _detect_filled_area(ink_pixels, total_pixels):
         """Detect if there are filled areas in the drawing"""
-        _, binary = cv2.threshold(gray_image, 127, 255, cv2.THRESH_BINARY)
-        filled_pixels = np.sum(binary == 0)  # Count black pixels
-        total_pixels = gray_image.size
-        fill_ratio = filled_pixels / total_pixels
+        fill_ratio = ink_pixels / total_pixels
         return fill_ratio > 0.1  # More than 10% filled
 
     @staticmethod
@@ -77,4 +300,9 @@ class ImageProcessor:
         if image_features.get('is_filled'):
             suggestions.extend(["filled", "solid", "colored"])
 
-        return " ".join(suggestions) if suggestions else "drawing"
\ No newline at end of file
+        return " ".join(suggestions) if suggestions else "drawing"
+
+    @staticmethod
+    def objects_to_text_suggestions(objects):
+        """Return one text query per object from ``analyze_objects``"""
+        return [ImageProcessor.image_to_text_suggestion(obj) for obj in objects]
\ No newline at end of file
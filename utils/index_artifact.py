@@ -0,0 +1,158 @@
+"""Compiled, memory-mapped emoji index.
+
+The artifact is a single binary file laid out as::
+
+    MAGIC | header length (uint64) | JSON header | padding | arrays...
+
+The JSON header holds the vocabulary, the emoji/category tables, the
+SHA-256 of the source database and the offset, dtype and shape of every
+array. Arrays are 64-byte aligned so they can be opened with
+``numpy.memmap``; several worker processes loading the same file then
+share its pages through the OS page cache.
+
+Build it with::
+
+    python -m utils.index_artifact assets/emoji_database.json
+"""
+import hashlib
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b"EMJIDX01"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+
+def default_index_path(emoji_db_path):
+    """Return the artifact path that sits next to the JSON database"""
+    return os.path.splitext(emoji_db_path)[0] + ".idx"
+
+
+def file_sha256(path):
+    """Return the hex SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_index_artifact(index_path, source_hash, emojis, emoji_list,
+                         vocabulary, idf, index, vectorizer_params):
+    """Write the artifact atomically (temporary file + rename)"""
+    vocab_terms = [None] * len(vocabulary)
+    for term, term_id in vocabulary.items():
+        vocab_terms[term_id] = term
+
+    arrays = {
+        'idf': np.ascontiguousarray(idf, dtype=np.float32),
+        'indptr': np.ascontiguousarray(index.indptr, dtype=np.int64),
+        'doc_ids': np.ascontiguousarray(index.doc_ids, dtype=np.int32),
+        'weights': np.ascontiguousarray(index.weights, dtype=np.float32),
+    }
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        offset = _aligned(offset + array.nbytes)
+
+    header = {
+        'version': FORMAT_VERSION,
+        'source_sha256': source_hash,
+        'vectorizer': vectorizer_params,
+        'vocabulary': vocab_terms,
+        'emoji_list': list(emoji_list),
+        'emojis': emojis,
+        'n_docs': index.n_docs,
+        'arrays': layout,
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    data_start = _aligned(len(MAGIC) + 8 + len(header_bytes))
+
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, index_path)
+
+
+def load_index_artifact(index_path, source_hash=None):
+    """Open an artifact, returning its header and memory-mapped arrays.
+
+    Returns ``None`` when the file is missing, unreadable, of another
+    format version, or was compiled from a different database than
+    ``source_hash``.
+    """
+    try:
+        with open(index_path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            (header_len,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_len).decode('utf-8'))
+            file_size = os.fstat(f.fileno()).st_size
+    except (OSError, ValueError, struct.error):
+        return None
+
+    if header.get('version') != FORMAT_VERSION:
+        return None
+    if source_hash is not None and header.get('source_sha256') != source_hash:
+        return None
+
+    data_start = _aligned(len(MAGIC) + 8 + header_len)
+    arrays = {}
+    try:
+        for name, spec in header['arrays'].items():
+            shape = tuple(spec['shape'])
+            dtype = np.dtype(spec['dtype'])
+            # A truncated or partly written file is treated as missing
+            end = data_start + spec['offset'] + dtype.itemsize * int(np.prod(shape))
+            if spec['offset'] < 0 or end > file_size:
+                return None
+            if 0 in shape:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+                continue
+            arrays[name] = np.memmap(index_path, dtype=dtype, mode='r',
+                                     offset=data_start + spec['offset'], shape=shape)
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+    return header, arrays
+
+
+def build_index_artifact(emoji_db_path, index_path=None):
+    """Compile the JSON database into a binary index artifact"""
+    from utils.emoji_matcher import EmojiMatcher
+
+    index_path = index_path or default_index_path(emoji_db_path)
+    matcher = EmojiMatcher(emoji_db_path, use_index_artifact=False)
+    if matcher.index is None:
+        raise ValueError(f"No emojis found in {emoji_db_path}")
+    matcher.save_index(index_path)
+    return index_path
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or len(argv) > 2:
+        print("usage: python -m utils.index_artifact EMOJI_DB_JSON [INDEX_PATH]")
+        return 2
+    index_path = build_index_artifact(*argv)
+    print(f"Wrote {index_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import heapq
+
+import numpy as np
+
+
+class InvertedIndex:
+    """Term -> posting-list index over L2-normalised TF-IDF rows.
+
+    Postings are stored as one contiguous CSC layout: for term ``t`` the
+    document ids live in ``doc_ids[indptr[t]:indptr[t + 1]]`` and the
+    matching weights in ``weights[...]``. Because both the document rows
+    and the query are L2-normalised, the dot product is the cosine
+    similarity, so only postings of the query's terms are ever touched.
+    """
+
+    def __init__(self, indptr, doc_ids, weights, n_docs):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.n_docs = int(n_docs)
+        self.n_terms = len(self.indptr) - 1
+        self._term_matrix = None
+
+    @classmethod
+    def from_csr(cls, matrix):
+        """Build the index from a (documents x terms) scipy CSR matrix"""
+        csc = matrix.tocsc()
+        csc.sort_indices()
+        return cls(csc.indptr, csc.indices, csc.data, csc.shape[0])
+
+    def with_changes(self, doc_map, replaced, new_doc_ids, new_term_ids, new_weights,
+                     n_docs, n_terms):
+        """Return a new index with documents removed, renumbered and added.
+
+        ``doc_map[old_id]`` is each document's new id, or -1 if it was
+        removed. Postings of removed documents and of the ``replaced`` ids
+        (whose new postings are passed in again) are dropped, the rest are
+        renumbered and the new postings merged in. This index is not modified.
+        """
+        term_of = np.repeat(np.arange(self.n_terms, dtype=np.int64), np.diff(self.indptr))
+        mapped = doc_map[self.doc_ids]
+        keep = mapped >= 0
+        if len(replaced):
+            keep &= ~np.isin(self.doc_ids, replaced)
+
+        terms = np.concatenate([term_of[keep], np.asarray(new_term_ids, dtype=np.int64)])
+        docs = np.concatenate([mapped[keep], np.asarray(new_doc_ids, dtype=np.int64)])
+        weights = np.concatenate([self.weights[keep], np.asarray(new_weights, dtype=np.float32)])
+
+        # Postings stay grouped by term and sorted by document id
+        order = np.lexsort((docs, terms))
+        indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=n_terms), out=indptr[1:])
+        return InvertedIndex(indptr, docs[order], weights[order], n_docs)
+
+    def score(self, term_ids, term_weights):
+        """Return (doc_ids, scores) for every document sharing a query term"""
+        if len(term_ids) == 1:
+            t = term_ids[0]
+            start, end = self.indptr[t], self.indptr[t + 1]
+            return self.doc_ids[start:end], self.weights[start:end] * np.float32(term_weights[0])
+
+        id_chunks = []
+        score_chunks = []
+        for t, w in zip(term_ids, term_weights):
+            start, end = self.indptr[t], self.indptr[t + 1]
+            if start == end:
+                continue
+            id_chunks.append(self.doc_ids[start:end])
+            score_chunks.append(self.weights[start:end] * np.float32(w))
+
+        if not id_chunks:
+            return self.doc_ids[:0], self.weights[:0]
+
+        ids = np.concatenate(id_chunks)
+        contributions = np.concatenate(score_chunks)
+        unique_ids, inverse = np.unique(ids, return_inverse=True)
+        scores = np.bincount(inverse, weights=contributions).astype(np.float32)
+        return unique_ids, scores
+
+    def top_k(self, term_ids, term_weights, k):
+        """Return the ids of the ``k`` best documents, best first.
+
+        Ties are broken by document id, and documents that share no term
+        with the query rank after every scored document in id order, which
+        mirrors the ordering of a brute-force cosine search.
+        """
+        k = min(k, self.n_docs)
+        if k <= 0:
+            return []
+
+        ids, scores = self.score(term_ids, term_weights)
+        ranked = heapq.nsmallest(k, zip((-scores).tolist(), ids.tolist()))
+        result = [doc_id for _, doc_id in ranked]
+
+        if len(result) < k:
+            # Pad with unmatched documents (cosine similarity of zero)
+            seen = set(result)
+            for doc_id in range(self.n_docs):
+                if doc_id not in seen:
+                    result.append(doc_id)
+                    if len(result) == k:
+                        break
+        return result
+
+    def term_matrix(self):
+        """Return the postings as a (terms x documents) CSR matrix sharing the arrays"""
+        if self._term_matrix is None:
+            # scipy is only needed by the batch path
+            from scipy import sparse
+
+            self._term_matrix = sparse.csr_matrix(
+                (self.weights, self.doc_ids, self.indptr),
+                shape=(self.n_terms, self.n_docs),
+                copy=False,
+            )
+        return self._term_matrix
+
+    def top_k_batch(self, query_matrix, k):
+        """Return a (queries x k) array of the best document ids per query row.
+
+        ``query_matrix`` is a sparse (queries x terms) matrix of normalised
+        query vectors. All rows are scored with one sparse product, and the
+        non-zero scores of every row are ranked together with one
+        ``lexsort``, so the work grows with the number of matching postings
+        rather than with queries x documents. The ranking is identical to
+        :meth:`top_k`, including the tie-breaking rules.
+        """
+        n_queries = query_matrix.shape[0]
+        k = min(k, self.n_docs)
+        result = np.zeros((n_queries, max(k, 0)), dtype=np.int64)
+        if k <= 0 or n_queries == 0:
+            return result
+
+        scores = (query_matrix @ self.term_matrix()).tocsr()
+        scores.eliminate_zeros()
+        row_counts = np.diff(scores.indptr)
+        rows = np.repeat(np.arange(n_queries), row_counts)
+
+        # Order every hit by query, then score (descending), then document id
+        order = np.lexsort((scores.indices, -scores.data, rows))
+        rows = rows[order]
+        docs = scores.indices[order]
+        ranks = np.arange(len(order)) - scores.indptr[rows]
+        keep = ranks < k
+        result[rows[keep], ranks[keep]] = docs[keep]
+
+        # Rows with fewer than k hits are padded with the lowest unmatched ids
+        short = np.flatnonzero(row_counts < k)
+        if len(short):
+            width = min(2 * k, self.n_docs)
+            hit = scores[short][:, :width].toarray() != 0
+            free = ~hit
+            free_rank = np.cumsum(free, axis=1) - 1 + row_counts[short][:, None]
+            fill = free & (free_rank < k)
+            fill_rows, fill_docs = np.nonzero(fill)
+            result[short[fill_rows], free_rank[fill_rows, fill_docs]] = fill_docs
+        return result
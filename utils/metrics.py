@@ -0,0 +1,215 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds, from 50 us to 10 s
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, as in the Prometheus data model"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Estimate the ``q`` quantile by interpolating inside its bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / bucket_count)
+            seen += bucket_count
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+        }
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Timer:
+    __slots__ = ('registry', 'stage', 'start')
+
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """Per-process stage timings aggregated into histograms.
+
+    Disabled by default; set EMOJI_METRICS=1 or call ``set_enabled(True)``.
+    While disabled, ``timer()`` returns a shared no-op context manager and
+    ``@timed`` wrappers only test one attribute before calling through.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._exporter = None
+
+    def set_enabled(self, enabled):
+        self.enabled = bool(enabled)
+
+    def timer(self, stage):
+        """Return a context manager that records its duration under ``stage``"""
+        if not self.enabled:
+            return NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def summary(self):
+        """Return {stage: {count, mean, p50, p95, p99, max}} in seconds"""
+        with self._lock:
+            return {stage: histogram.summary()
+                    for stage, histogram in sorted(self._histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render_prometheus(self, name="emoji_stage_seconds"):
+        """Render all histograms in the Prometheus text exposition format"""
+        lines = [f"# HELP {name} Time spent in instrumented stages.",
+                 f"# TYPE {name} histogram"]
+        with self._lock:
+            for stage, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum:.9g}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Atomically write the Prometheus text export to ``path``"""
+        # A unique temporary file per call, so concurrent writers do not collide
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                        prefix=os.path.basename(path) + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self.render_prometheus())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def start_export(self, path, interval=15.0):
+        """Rewrite the Prometheus export at ``path`` every ``interval`` seconds while enabled"""
+        with self._lock:
+            if self._exporter is not None:
+                return
+            self._exporter = threading.Thread(target=self._export, args=(path, interval),
+                                              name="metrics-export", daemon=True)
+        self._exporter.start()
+
+    def _export(self, path, interval):
+        while True:
+            time.sleep(interval)
+            if not self.enabled:
+                continue
+            try:
+                self.write_prometheus(path)
+            except OSError as e:
+                print(f"Could not write metrics to {path}: {e}")
+
+
+def env_flag(name):
+    """Whether the environment variable ``name`` is set to a true value"""
+    return os.environ.get(name, '').lower() not in ('', '0', 'false', 'no')
+
+
+_registry = MetricsRegistry(enabled=env_flag('EMOJI_METRICS'))
+
+
+def get_metrics():
+    """Return the process-wide metrics registry"""
+    return _registry
+
+
+def timed(stage):
+    """Decorator recording each call's duration under ``stage`` while metrics are enabled"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _registry.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _registry.observe(stage, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def profile_call(fn, *args, sort='cumulative', limit=40):
+    """Run ``fn(*args)`` under cProfile; returns (result, formatted stats)"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        result = fn(*args)
+    finally:
+        profiler.disable()
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats(sort).print_stats(limit)
+    return result, output.getvalue()
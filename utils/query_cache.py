@@ -0,0 +1,132 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+
+class QueryCache:
+    """Process-wide LRU cache of text matching and keyword search results.
+
+    Text queries are keyed by ``EmojiMatcher.canonical_query``, so texts that
+    only differ in case, whitespace, stop words or word order share an
+    entry. Keyword searches match substrings, so only their case is folded.
+    Entries expire after ``ttl`` seconds and the whole cache is dropped as
+    soon as it is used with a different matcher version, e.g. after the
+    database was reloaded. Safe to share between sessions and threads.
+    """
+
+    def __init__(self, maxsize=4096, ttl=600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._matcher_ref = None
+        self._generation = 0
+        self._prewarmed_ref = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _bind(self, matcher):
+        """Drop every entry unless they came from ``matcher``; returns the cache generation"""
+        if self._matcher_ref is not None and self._matcher_ref() is matcher:
+            return self._generation
+        with self._lock:
+            if self._matcher_ref is None or self._matcher_ref() is not matcher:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._matcher_ref = weakref.ref(matcher)
+                self._generation += 1
+            return self._generation
+
+    def get_or_compute(self, key, compute, generation=None):
+        """Return the cached value for ``key``, calling ``compute()`` on a miss.
+
+        With a ``generation`` from ``_bind``, a value computed while the cache
+        was rebound to another matcher is returned but not stored.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+
+        # Computed outside the lock; concurrent misses for one key just race
+        value = compute()
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return value
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def text_to_emoji(self, matcher, text, top_k=5):
+        """Cached ``matcher.text_to_emoji``"""
+        if not text:
+            return matcher.text_to_emoji(text, top_k)
+        generation = self._bind(matcher)
+        key = ('text', matcher.canonical_query(text), top_k)
+        return list(self.get_or_compute(
+            key, lambda: tuple(matcher.text_to_emoji(text, top_k)), generation))
+
+    def search_emojis_with_count(self, matcher, query, limit=None, offset=0):
+        """Cached ``matcher.search_emojis_with_count``"""
+        generation = self._bind(matcher)
+        key = ('search', query.lower(), limit, offset)
+
+        def compute():
+            emojis, total = matcher.search_emojis_with_count(query, limit, offset)
+            return tuple(emojis), total
+
+        emojis, total = self.get_or_compute(key, compute, generation)
+        return list(emojis), total
+
+    def search_emojis(self, matcher, query, limit=None, offset=0):
+        """Cached ``matcher.search_emojis``"""
+        return self.search_emojis_with_count(matcher, query, limit, offset)[0]
+
+    def prewarm(self, matcher, texts=(), top_k=5, searches=(), search_limit=None):
+        """Fill the cache with common queries, once per matcher version.
+
+        Prewarming lookups are not counted in the hit-rate statistics.
+        """
+        if self._prewarmed_ref is not None and self._prewarmed_ref() is matcher:
+            return
+        counters = self.hits, self.misses
+        for text in texts:
+            self.text_to_emoji(matcher, text, top_k)
+        for query in searches:
+            self.search_emojis_with_count(matcher, query, search_limit)
+        with self._lock:
+            self.hits, self.misses = counters
+        self._prewarmed_ref = weakref.ref(matcher)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """Return hit/miss counters, evictions and the current size"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
@@ -0,0 +1,57 @@
+import functools
+from html import escape
+
+
+class ResultRenderer:
+    """Builds emoji result blocks as single HTML strings.
+
+    Each result block is sent with one ``st.markdown`` call instead of one
+    per cell, and styled through the classes in ``assets/styles.css``.
+    Per-emoji fragments only depend on the database entry, so they are
+    cached; the shared renderer is rebuilt with each matcher version.
+    """
+
+    def __init__(self, matcher, fragment_cache_size=4096):
+        self.matcher = matcher
+        self.grid_cell = functools.lru_cache(maxsize=fragment_cache_size)(self._grid_cell)
+        self.suggestion_card = functools.lru_cache(maxsize=fragment_cache_size)(self._suggestion_card)
+
+    def _grid_cell(self, emoji):
+        """Search grid cell: the emoji and its first two keywords"""
+        info = self.matcher.get_emoji_info(emoji)
+        keywords = escape(', '.join(info['keywords'][:2]))
+        return (f"<div class='emoji-cell'><div class='emoji-cell-glyph'>{escape(emoji)}</div>"
+                f"<small>{keywords}</small></div>")
+
+    def _suggestion_card(self, emoji):
+        """Suggestion card: the emoji and its category"""
+        info = self.matcher.get_emoji_info(emoji)
+        return (f"<div class='suggestion-card'><div class='suggestion-emoji'>{escape(emoji)}</div>"
+                f"<small>{escape(info['category'].title())}</small></div>")
+
+    def best_match_card(self, emoji):
+        """Large card for the best match with its keywords and category"""
+        info = self.matcher.get_emoji_info(emoji)
+        return (f"<div class='emoji-result best-match'>"
+                f"<div class='emoji-display'>{escape(emoji)}</div>"
+                f"<h3>Best Match</h3>"
+                f"<p><strong>Keywords:</strong> {escape(', '.join(info['keywords'][:5]))}</p>"
+                f"<p><strong>Category:</strong> {escape(info['category'].title())}</p>"
+                f"</div>")
+
+    def render_results(self, emojis, max_suggestions=7):
+        """Best match card followed by a row of similar suggestions"""
+        if not emojis:
+            return ""
+        parts = [self.best_match_card(emojis[0])]
+        suggestions = emojis[1:max_suggestions + 1]
+        if suggestions:
+            parts.append("<h3 class='results-heading'>Similar Suggestions</h3>")
+            parts.append("<div class='suggestion-row'>")
+            parts.extend(self.suggestion_card(emoji) for emoji in suggestions)
+            parts.append("</div>")
+        return "".join(parts)
+
+    def render_grid(self, emojis):
+        """Responsive grid of search results"""
+        return "<div class='emoji-grid'>" + "".join(self.grid_cell(emoji) for emoji in emojis) + "</div>"
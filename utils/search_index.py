@@ -0,0 +1,222 @@
+import bisect
+import copy
+
+import numpy as np
+
+# Match quality tiers, best first
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING, NO_MATCH = range(5)
+
+
+class KeywordSearchIndex:
+    """Substring and prefix lookup over pre-lowercased emoji keywords.
+
+    Every distinct keyword gets an id. Substring candidates come from a
+    character n-gram index (n <= 3), and prefix matches are contiguous
+    ranges of the sorted keyword and keyword-word lists, found with
+    ``bisect`` (a flattened trie). A keyword match is ranked as exact,
+    prefix, word prefix or plain substring, and each emoji takes the best
+    rank among its keywords.
+    """
+
+    NGRAM = 3
+
+    def __init__(self, emoji_keywords):
+        """``emoji_keywords`` is a list of keyword lists, one per emoji id"""
+        self.n_emojis = len(emoji_keywords)
+
+        keyword_ids = {}
+        pair_emojis = []
+        pair_keywords = []
+        for emoji_id, keywords in enumerate(emoji_keywords):
+            for keyword in dict.fromkeys(k.lower() for k in keywords):
+                keyword_id = keyword_ids.setdefault(keyword, len(keyword_ids))
+                pair_emojis.append(emoji_id)
+                pair_keywords.append(keyword_id)
+
+        self.keywords = list(keyword_ids)
+        self.keyword_ids = keyword_ids
+        n_keywords = len(self.keywords)
+
+        # Keyword -> emoji postings in CSR form
+        pair_keywords = np.asarray(pair_keywords, dtype=np.int32)
+        order = np.argsort(pair_keywords, kind='stable')
+        self.keyword_emojis = np.asarray(pair_emojis, dtype=np.int32)[order]
+        self.keyword_indptr = np.zeros(n_keywords + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pair_keywords, minlength=n_keywords), out=self.keyword_indptr[1:])
+
+        # Sorted keywords and keyword words for prefix ranges
+        order = sorted(range(n_keywords), key=self.keywords.__getitem__)
+        self.sorted_keywords = [self.keywords[i] for i in order]
+        self.sorted_keyword_ids = np.asarray(order, dtype=np.int32)
+
+        words = sorted((word, keyword_id)
+                       for keyword_id, keyword in enumerate(self.keywords)
+                       for word in set(keyword.split()))
+        self.sorted_words = [word for word, _ in words]
+        self.sorted_word_keyword_ids = np.asarray([kid for _, kid in words], dtype=np.int32)
+
+        # Character n-gram postings (n = 1..NGRAM) -> sorted keyword ids
+        grams = {}
+        for keyword_id, keyword in enumerate(self.keywords):
+            seen = set()
+            for n in range(1, self.NGRAM + 1):
+                for i in range(len(keyword) - n + 1):
+                    seen.add(keyword[i:i + n])
+            for gram in seen:
+                grams.setdefault(gram, []).append(keyword_id)
+        self.ngrams = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in grams.items()}
+        self._all_keyword_ids = np.arange(n_keywords, dtype=np.int32)
+
+    def with_changes(self, doc_map, replaced, new_emoji_keywords, n_emojis):
+        """Return a new index with emojis renumbered, dropped or (re)added.
+
+        ``doc_map`` maps old emoji ids to new ones (-1 drops the emoji), the
+        keywords of the old ``replaced`` ids are dropped, and
+        ``new_emoji_keywords`` lists (new emoji id, keywords) pairs. Keywords
+        no emoji uses any more keep their id with empty postings. Tables that
+        do not change are shared with this index, which is left untouched.
+        """
+        index = copy.copy(self)
+        index.n_emojis = n_emojis
+
+        added = {}
+        pair_emojis = []
+        pair_keywords = []
+        for emoji_id, keywords in new_emoji_keywords:
+            for keyword in dict.fromkeys(k.lower() for k in keywords):
+                keyword_id = self.keyword_ids.get(keyword)
+                if keyword_id is None:
+                    keyword_id = added.setdefault(keyword, len(self.keywords) + len(added))
+                pair_emojis.append(emoji_id)
+                pair_keywords.append(keyword_id)
+        n_keywords = len(self.keywords) + len(added)
+
+        # Remap the surviving postings and merge in the new ones
+        keyword_of = np.repeat(np.arange(len(self.keywords), dtype=np.int32),
+                               np.diff(self.keyword_indptr))
+        emojis = np.asarray(doc_map, dtype=np.int64)[self.keyword_emojis]
+        keep = (emojis >= 0) & ~np.isin(self.keyword_emojis, replaced)
+        emojis = np.concatenate([emojis[keep], np.asarray(pair_emojis, dtype=np.int64)])
+        keyword_of = np.concatenate([keyword_of[keep], np.asarray(pair_keywords, dtype=np.int32)])
+        order = np.lexsort((emojis, keyword_of))
+        index.keyword_emojis = emojis[order].astype(np.int32)
+        index.keyword_indptr = np.zeros(n_keywords + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keyword_of, minlength=n_keywords), out=index.keyword_indptr[1:])
+
+        if added:
+            index.keywords = self.keywords + list(added)
+            index.keyword_ids = dict(self.keyword_ids, **added)
+            index.sorted_keywords, index.sorted_keyword_ids = _insert_sorted(
+                self.sorted_keywords, self.sorted_keyword_ids, added.items())
+            index.sorted_words, index.sorted_word_keyword_ids = _insert_sorted(
+                self.sorted_words, self.sorted_word_keyword_ids,
+                [(word, keyword_id) for keyword, keyword_id in added.items()
+                 for word in set(keyword.split())])
+
+            ngrams = dict(self.ngrams)
+            for keyword, keyword_id in added.items():
+                seen = set()
+                for n in range(1, self.NGRAM + 1):
+                    for i in range(len(keyword) - n + 1):
+                        seen.add(keyword[i:i + n])
+                for gram in seen:
+                    ids = ngrams.get(gram)
+                    # New ids are the largest, so appending keeps postings sorted
+                    ngrams[gram] = (np.append(ids, np.int32(keyword_id)) if ids is not None
+                                    else np.asarray([keyword_id], dtype=np.int32))
+            index.ngrams = ngrams
+            index._all_keyword_ids = np.arange(n_keywords, dtype=np.int32)
+        return index
+
+    @staticmethod
+    def _prefix_range(sorted_keys, prefix):
+        lo = bisect.bisect_left(sorted_keys, prefix)
+        hi = bisect.bisect_left(sorted_keys, prefix + '\U0010ffff', lo)
+        return lo, hi
+
+    def _substring_keyword_ids(self, query):
+        """Return ids of every keyword containing ``query``"""
+        if not query:
+            return self._all_keyword_ids
+        if len(query) <= self.NGRAM:
+            return self.ngrams.get(query, self._all_keyword_ids[:0])
+
+        grams = [query[i:i + self.NGRAM] for i in range(len(query) - self.NGRAM + 1)]
+        postings = []
+        for gram in grams:
+            ids = self.ngrams.get(gram)
+            if ids is None:
+                return self._all_keyword_ids[:0]
+            postings.append(ids)
+        postings.sort(key=len)
+        candidates = postings[0]
+        for ids in postings[1:]:
+            candidates = np.intersect1d(candidates, ids, assume_unique=True)
+            if not len(candidates):
+                break
+        # Shared n-grams do not guarantee a contiguous match
+        return np.asarray([k for k in candidates.tolist() if query in self.keywords[k]],
+                          dtype=np.int32)
+
+    def emoji_tiers(self, query):
+        """Return the best match tier of every emoji for ``query``"""
+        query = query.lower()
+        keyword_tiers = np.full(len(self.keywords), NO_MATCH, dtype=np.int8)
+        keyword_tiers[self._substring_keyword_ids(query)] = SUBSTRING
+
+        lo, hi = self._prefix_range(self.sorted_words, query)
+        keyword_tiers[self.sorted_word_keyword_ids[lo:hi]] = WORD_PREFIX
+        lo, hi = self._prefix_range(self.sorted_keywords, query)
+        keyword_tiers[self.sorted_keyword_ids[lo:hi]] = PREFIX
+        exact = self.keyword_ids.get(query)
+        if exact is not None:
+            keyword_tiers[exact] = EXACT
+
+        # Assign worst tiers first so better tiers overwrite them
+        tiers = np.full(self.n_emojis, NO_MATCH, dtype=np.int8)
+        matched = np.flatnonzero(keyword_tiers < NO_MATCH)
+        matched_tiers = keyword_tiers[matched]
+        for tier in (SUBSTRING, WORD_PREFIX, PREFIX, EXACT):
+            tiers[self._emojis_of(matched[matched_tiers == tier])] = tier
+        return tiers
+
+    def _emojis_of(self, keyword_ids):
+        """Return the concatenated emoji postings of ``keyword_ids``"""
+        starts = self.keyword_indptr[keyword_ids]
+        lengths = self.keyword_indptr[keyword_ids + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return self.keyword_emojis[offsets + np.arange(len(offsets))]
+
+    def search(self, query, limit=None, offset=0):
+        """Return (emoji_ids, total) ranked by match tier, then emoji id.
+
+        ``offset`` and ``limit`` select one page of the ranking; ``total``
+        always counts every match.
+        """
+        tiers = self.emoji_tiers(query)
+        total = int(np.count_nonzero(tiers < NO_MATCH))
+        end = total if limit is None else min(offset + limit, total)
+
+        result = []
+        for tier in (EXACT, PREFIX, WORD_PREFIX, SUBSTRING):
+            if len(result) >= end:
+                break
+            ids = np.flatnonzero(tiers == tier)
+            result.extend(ids[:end - len(result)].tolist())
+        return result[offset:], total
+
+
+def _insert_sorted(keys, ids, new_pairs):
+    """Insert (key, id) pairs into the parallel sorted ``keys`` list and ``ids`` array"""
+    new_pairs = sorted(new_pairs)
+    # New ids are larger than existing ones, so they go after equal keys
+    positions = [bisect.bisect_right(keys, key) for key, _ in new_pairs]
+    merged = []
+    start = 0
+    for position, (key, _) in zip(positions, new_pairs):
+        merged.extend(keys[start:position])
+        merged.append(key)
+        start = position
+    merged.extend(keys[start:])
+    new_ids = np.asarray([keyword_id for _, keyword_id in new_pairs], dtype=np.int32)
+    return merged, np.insert(ids, positions, new_ids)
@@ -0,0 +1,225 @@
+import json
+import os
+import threading
+import time
+
+from utils.analysis_pool import AnalysisPool
+from utils.emoji_matcher import EmojiMatcher
+from utils.query_cache import QueryCache
+
+
+class SharedResources:
+    """Process-wide cache of read-only objects shared by every session.
+
+    The matcher is built once per database file. When the file changes on
+    disk (detected through its modification time and size) the current
+    matcher keeps serving while a background thread applies the changes to
+    a new version and swaps it in. Objects handed out are never mutated
+    afterwards, so concurrent sessions can use them without extra locking.
+    The OpenCV-based subsystems are imported on first use, so sessions that
+    never draw do not pay for loading cv2.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matchers = {}
+        self._image_processor = None
+        self._visual_matchers = {}
+        self._result_renderers = {}
+        self._analysis_pool = None
+        self._query_cache = None
+        self._refreshing = set()
+        self._unreadable = {}
+        self._watcher = None
+        self._stats = {
+            'matcher_builds': 0,
+            'matcher_build_seconds': 0.0,
+            'last_build_seconds': 0.0,
+            'matcher_hits': 0,
+            'matcher_updates': 0,
+            'last_update_seconds': 0.0,
+            'matcher_version': 0,
+        }
+
+    @staticmethod
+    def _file_signature(path):
+        """Return a cheap fingerprint of the file on disk"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get_emoji_matcher(self, emoji_db_path="assets/emoji_database.json"):
+        """Return the shared matcher, refreshing it in the background if the database changed"""
+        key = os.path.abspath(emoji_db_path)
+        signature = self._file_signature(key)
+
+        cached = self._matchers.get(key)
+        if cached is not None:
+            if cached[0] != signature:
+                self._schedule_refresh(key, signature)
+            self._stats['matcher_hits'] += 1
+            return cached[1]
+
+        with self._lock:
+            # Another thread may have built it while we were waiting
+            cached = self._matchers.get(key)
+            if cached is not None:
+                self._stats['matcher_hits'] += 1
+                return cached[1]
+
+            start = time.perf_counter()
+            # EMOJI_SEARCH_MODE=ann switches large catalogs to approximate search
+            matcher = EmojiMatcher(
+                emoji_db_path,
+                search_mode=os.environ.get('EMOJI_SEARCH_MODE', 'exact'),
+                ann_params={'n_probe': int(os.environ.get('EMOJI_ANN_PROBE', 8))},
+            )
+            elapsed = time.perf_counter() - start
+
+            self._matchers[key] = (signature, matcher)
+            self._stats['matcher_builds'] += 1
+            self._stats['matcher_build_seconds'] += elapsed
+            self._stats['last_build_seconds'] = elapsed
+            return matcher
+
+    def _schedule_refresh(self, key, signature):
+        """Start a background refresh of the matcher for ``key`` unless one is running"""
+        with self._lock:
+            # A missing file keeps the last good version serving, and each
+            # unreadable version of the file is reported only once
+            if (signature is None or key in self._refreshing
+                    or self._unreadable.get(key) == signature):
+                return
+            self._refreshing.add(key)
+        threading.Thread(target=self._refresh_matcher, args=(key,),
+                         name="emoji-db-refresh", daemon=True).start()
+
+    def _refresh_matcher(self, key):
+        """Apply the database file's changes to a new matcher version and swap it in"""
+        try:
+            signature = self._file_signature(key)
+            current_signature, matcher = self._matchers[key]
+            if signature is None or signature == current_signature:
+                return
+            try:
+                with open(key, 'r', encoding='utf-8') as f:
+                    emojis = json.load(f)['emojis']
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Could not reload emoji database {key}: {e}")
+                self._unreadable[key] = signature
+                return
+
+            start = time.perf_counter()
+            updated = matcher.apply_database(emojis)
+            elapsed = time.perf_counter() - start
+
+            # If the file changed again while loading, the old signature
+            # makes the next check schedule another refresh
+            with self._lock:
+                self._matchers[key] = (signature, updated)
+                if updated is matcher:
+                    # Touched or saved unchanged: keep serving this version
+                    return
+                self._stats['matcher_updates'] += 1
+                self._stats['last_update_seconds'] = elapsed
+                self._stats['matcher_version'] = updated.version
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def start_watcher(self, interval=2.0):
+        """Poll the loaded databases every ``interval`` seconds and refresh changed ones"""
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, args=(interval,),
+                                             name="emoji-db-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            for key, (signature, _) in list(self._matchers.items()):
+                current = self._file_signature(key)
+                if current != signature:
+                    self._schedule_refresh(key, current)
+
+    def get_image_processor(self):
+        """Return the shared image processor"""
+        if self._image_processor is None:
+            with self._lock:
+                if self._image_processor is None:
+                    from utils.image_processor import ImageProcessor
+
+                    self._image_processor = ImageProcessor()
+        return self._image_processor
+
+    def get_visual_matcher(self, emoji_db_path="assets/emoji_database.json"):
+        """Return the shared sketch matcher for the current emoji matcher"""
+        matcher = self.get_emoji_matcher(emoji_db_path)
+        key = os.path.abspath(emoji_db_path)
+
+        cached = self._visual_matchers.get(key)
+        if cached is not None and cached[0] is matcher:
+            return cached[1]
+
+        with self._lock:
+            cached = self._visual_matchers.get(key)
+            if cached is not None and cached[0] is matcher:
+                return cached[1]
+            from utils.visual_matcher import VisualMatcher
+
+            visual_matcher = VisualMatcher(matcher.emoji_list)
+            self._visual_matchers[key] = (matcher, visual_matcher)
+            return visual_matcher
+
+    def get_result_renderer(self, emoji_db_path="assets/emoji_database.json"):
+        """Return the shared HTML result renderer for the current emoji matcher"""
+        matcher = self.get_emoji_matcher(emoji_db_path)
+        key = os.path.abspath(emoji_db_path)
+
+        cached = self._result_renderers.get(key)
+        if cached is not None and cached[0] is matcher:
+            return cached[1]
+
+        with self._lock:
+            cached = self._result_renderers.get(key)
+            if cached is not None and cached[0] is matcher:
+                return cached[1]
+            from utils.result_renderer import ResultRenderer
+
+            renderer = ResultRenderer(matcher)
+            self._result_renderers[key] = (matcher, renderer)
+            return renderer
+
+    def get_analysis_pool(self):
+        """Return the shared canvas analysis worker pool"""
+        if self._analysis_pool is None:
+            with self._lock:
+                if self._analysis_pool is None:
+                    self._analysis_pool = AnalysisPool.from_environment()
+        return self._analysis_pool
+
+    def get_query_cache(self):
+        """Return the shared text query and keyword search cache"""
+        if self._query_cache is None:
+            with self._lock:
+                if self._query_cache is None:
+                    self._query_cache = QueryCache(
+                        maxsize=int(os.environ.get('EMOJI_QUERY_CACHE_SIZE', 4096)),
+                        ttl=float(os.environ.get('EMOJI_QUERY_CACHE_TTL', 600)))
+        return self._query_cache
+
+    def get_stats(self):
+        """Return a snapshot of the build counters"""
+        return dict(self._stats)
+
+
+_shared = SharedResources()
+
+
+def get_shared_resources():
+    """Return the process-wide SharedResources instance"""
+    return _shared
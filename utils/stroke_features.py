@@ -0,0 +1,134 @@
+import numpy as np
+
+MIN_LINE_LENGTH = 30
+MIN_SHAPE_AREA = 100
+
+
+def _path_points(obj):
+    """Return the (N, 2) vertices of a fabric.js path, including curve control points"""
+    points = []
+    for command in obj.get('path') or []:
+        # Every command is [letter, x1, y1, x2, y2, ...]
+        coords = command[1:]
+        points.extend(zip(coords[0::2], coords[1::2]))
+    return np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+
+def _stroke_metrics(obj):
+    """Return shape metrics for one fabric.js object, or None if unsupported"""
+    kind = obj.get('type')
+    scale = np.array([obj.get('scaleX', 1) or 1, obj.get('scaleY', 1) or 1], dtype=np.float64)
+    stroke_width = float(obj.get('strokeWidth', 1) or 1)
+    filled = obj.get('fill') not in (None, '', 'transparent') and not str(obj.get('fill')).endswith(', 0)')
+
+    if kind == 'path':
+        points = _path_points(obj) * scale
+        if len(points) < 2:
+            return None
+        segments = np.diff(points, axis=0)
+        length = float(np.hypot(segments[:, 0], segments[:, 1]).sum())
+        chord = float(np.hypot(*(points[-1] - points[0])))
+        x, y = points[:, 0], points[:, 1]
+        area = 0.5 * abs(float(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))))
+        perimeter = length + chord  # Implicitly closed polygon
+        return {
+            'length': length,
+            'straightness': chord / length if length else 0.0,
+            'closure': max(0.0, 1.0 - chord / length) if length else 0.0,
+            'circularity': 4 * np.pi * area / (perimeter * perimeter) if perimeter else 0.0,
+            'area': area,
+            'ink_area': length * stroke_width,
+        }
+
+    if kind == 'line':
+        dx = (obj.get('x2', 0) - obj.get('x1', 0)) * scale[0]
+        dy = (obj.get('y2', 0) - obj.get('y1', 0)) * scale[1]
+        length = float(np.hypot(dx, dy))
+        return {'length': length, 'straightness': 1.0, 'closure': 0.0,
+                'circularity': 0.0, 'area': 0.0, 'ink_area': length * stroke_width}
+
+    if kind == 'rect':
+        w = obj.get('width', 0) * scale[0]
+        h = obj.get('height', 0) * scale[1]
+        perimeter = 2 * (w + h)
+        area = w * h
+        return {'length': perimeter, 'straightness': 1.0, 'closure': 1.0,
+                'circularity': 4 * np.pi * area / (perimeter * perimeter) if perimeter else 0.0,
+                'area': area, 'ink_area': area if filled else perimeter * stroke_width}
+
+    if kind in ('circle', 'ellipse'):
+        rx = obj.get('rx', obj.get('radius', 0)) * scale[0]
+        ry = obj.get('ry', obj.get('radius', 0)) * scale[1]
+        # Ramanujan's approximation of the ellipse perimeter
+        perimeter = np.pi * (3 * (rx + ry) - np.sqrt((3 * rx + ry) * (rx + 3 * ry)))
+        area = np.pi * rx * ry
+        return {'length': float(perimeter), 'straightness': 0.0, 'closure': 1.0,
+                'circularity': float(4 * np.pi * area / (perimeter * perimeter)) if perimeter else 0.0,
+                'area': float(area), 'ink_area': float(area if filled else perimeter * stroke_width)}
+
+    return None
+
+
+def _object_key(obj):
+    """Cheap identity of an object; changes when it is moved, scaled or rotated"""
+    return (obj.get('type'), obj.get('left'), obj.get('top'), obj.get('scaleX'),
+            obj.get('scaleY'), obj.get('angle'), obj.get('width'), obj.get('height'))
+
+
+class StrokeFeatureExtractor:
+    """Drawing features computed from fabric.js vector objects.
+
+    Produces the same feature keys as ``ImageProcessor.analyze_drawing_features``
+    plus per-drawing stroke statistics. Objects already measured are
+    remembered, so appending a stroke only measures the new one; any other
+    edit (undo, clear, transform) triggers a full recompute.
+    """
+
+    def __init__(self, canvas_width=400, canvas_height=400):
+        self.canvas_area = float(canvas_width * canvas_height)
+        self._keys = []
+        self._metrics = []
+
+    def reset(self):
+        self._keys = []
+        self._metrics = []
+
+    def update(self, json_data):
+        """Measure new objects in ``json_data`` and return the drawing features"""
+        objects = (json_data or {}).get('objects') or []
+        keys = [_object_key(obj) for obj in objects]
+
+        n_known = len(self._keys)
+        if len(keys) < n_known or keys[:n_known] != self._keys:
+            self.reset()
+            n_known = 0
+
+        for obj, key in zip(objects[n_known:], keys[n_known:]):
+            self._keys.append(key)
+            self._metrics.append(_stroke_metrics(obj))
+        return self.features()
+
+    def features(self):
+        """Aggregate the per-object metrics into drawing features"""
+        metrics = [m for m in self._metrics if m is not None]
+        if not metrics:
+            return {'has_content': False, 'is_circular': False, 'has_lines': False,
+                    'is_filled': False, 'stroke_count': 0}
+
+        columns = {name: np.array([m[name] for m in metrics]) for name in metrics[0]}
+        closed = columns['closure'] > 0.8
+        circular = closed & (columns['circularity'] > 0.7) & (columns['area'] > MIN_SHAPE_AREA)
+        straight = (columns['straightness'] > 0.95) & (columns['length'] >= MIN_LINE_LENGTH)
+        fill_ratio = float(columns['ink_area'].sum()) / self.canvas_area
+
+        return {
+            'has_content': True,
+            'is_circular': bool(circular.any()),
+            'has_lines': bool(straight.any()),
+            'is_filled': fill_ratio > 0.1,
+            'stroke_count': len(metrics),
+            'circularity': float(columns['circularity'].max()),
+            'straightness': float(columns['straightness'].max()),
+            'closure': float(columns['closure'].max()),
+            'fill_ratio': fill_ratio,
+        }
@@ -0,0 +1,151 @@
+import os
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Checked in order; the first font that loads is used
+EMOJI_FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/noto/NotoColorEmoji.ttf",
+    "/usr/share/fonts/noto/NotoColorEmoji.ttf",
+    "/System/Library/Fonts/Apple Color Emoji.ttc",
+    "C:/Windows/Fonts/seguiemj.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+]
+RENDER_SIZE = 109  # The only size bitmap color-emoji fonts support
+MISSING_GLYPH = "\U000F0000"  # Private-use codepoint, renders as the .notdef box
+
+
+def _load_font(font_path=None):
+    """Load the emoji font from ``font_path``, $EMOJI_FONT_PATH or known locations"""
+    candidates = [font_path, os.environ.get('EMOJI_FONT_PATH')] + EMOJI_FONT_CANDIDATES
+    for path in candidates:
+        if not path or not os.path.exists(path):
+            continue
+        try:
+            return ImageFont.truetype(path, RENDER_SIZE)
+        except OSError:
+            continue
+    return None
+
+
+def normalize_glyph(gray, size=64, background_threshold=250):
+    """Crop a grayscale image to its content, pad it square and resize to ``size``.
+
+    Drawings and emoji are then compared independently of their position
+    and scale on the canvas. Returns None for an empty image.
+    """
+    content = (gray < background_threshold).astype(np.uint8)
+    x, y, w, h = cv2.boundingRect(content)
+    if w == 0 or h == 0:
+        return None
+
+    crop = gray[y:y + h, x:x + w]
+    side = max(w, h)
+    square = np.full((side, side), 255, dtype=np.uint8)
+    oy, ox = (side - h) // 2, (side - w) // 2
+    square[oy:oy + h, ox:ox + w] = crop
+    interpolation = cv2.INTER_AREA if side > size else cv2.INTER_LINEAR
+    return cv2.resize(square, (size, size), interpolation=interpolation)
+
+
+def hog_descriptor(image, cell=8, bins=9):
+    """Histogram of oriented gradients with 2x2-cell L2-normalised blocks.
+
+    Implemented with NumPy because ``cv2.HOGDescriptor`` is not available
+    in every OpenCV build.
+    """
+    image = image.astype(np.float32)
+    gx = cv2.Sobel(image, cv2.CV_32F, 1, 0, ksize=1)
+    gy = cv2.Sobel(image, cv2.CV_32F, 0, 1, ksize=1)
+    magnitude, angle = cv2.cartToPolar(gx, gy, angleInDegrees=True)
+
+    # Unsigned orientation binned into ``bins`` sectors over 0-180 degrees
+    orientation = (np.mod(angle, 180.0) * (bins / 180.0)).astype(np.int64) % bins
+    rows, cols = image.shape[0] // cell, image.shape[1] // cell
+    cell_y = np.minimum(np.arange(image.shape[0]) // cell, rows - 1)
+    cell_x = np.minimum(np.arange(image.shape[1]) // cell, cols - 1)
+    cell_index = cell_y[:, None] * cols + cell_x[None, :]
+    histograms = np.bincount((cell_index * bins + orientation).ravel(),
+                             weights=magnitude.ravel(),
+                             minlength=rows * cols * bins).reshape(rows, cols, bins)
+
+    blocks = np.concatenate([histograms[:-1, :-1], histograms[1:, :-1],
+                             histograms[:-1, 1:], histograms[1:, 1:]], axis=2)
+    norms = np.linalg.norm(blocks, axis=2, keepdims=True)
+    return (blocks / (norms + 1e-6)).ravel().astype(np.float32)
+
+
+class VisualMatcher:
+    """Sketch-to-emoji nearest-neighbour search on HOG descriptors.
+
+    Every emoji is rendered once to a ``size`` x ``size`` grayscale template
+    and described with a HOG vector. Descriptors are L2-normalised and kept
+    in one contiguous float32 matrix, so ranking a drawing is a single
+    matrix-vector product.
+    """
+
+    def __init__(self, emoji_list, font_path=None, size=64):
+        self.size = size
+        self.emoji_list = []
+        self.templates = np.zeros((0, size, size), dtype=np.uint8)
+        self.descriptors = np.zeros((0, hog_descriptor(np.zeros((size, size))).size),
+                                    dtype=np.float32)
+
+        font = _load_font(font_path)
+        if font is None:
+            print("No emoji font found; visual matching is disabled")
+            return
+        self._build(emoji_list, font)
+
+    @property
+    def available(self):
+        return len(self.emoji_list) > 0
+
+    @staticmethod
+    def _render(text, font):
+        """Render ``text`` with ``font`` to a white-background grayscale array"""
+        canvas = Image.new("RGB", (RENDER_SIZE * 2, RENDER_SIZE * 2), "white")
+        draw = ImageDraw.Draw(canvas)
+        draw.text((RENDER_SIZE // 2, RENDER_SIZE // 2), text, font=font,
+                  fill="black", embedded_color=True)
+        return cv2.cvtColor(np.asarray(canvas), cv2.COLOR_RGB2GRAY)
+
+    def _build(self, emoji_list, font):
+        missing = normalize_glyph(self._render(MISSING_GLYPH, font), self.size)
+
+        emojis, templates = [], []
+        for emoji in emoji_list:
+            template = normalize_glyph(self._render(emoji, font), self.size)
+            # Skip emojis the font cannot draw
+            if template is None or (missing is not None and np.array_equal(template, missing)):
+                continue
+            emojis.append(emoji)
+            templates.append(template)
+
+        if not templates:
+            return
+        self.emoji_list = emojis
+        self.templates = np.stack(templates)
+        self.descriptors = np.ascontiguousarray(
+            np.stack([self.describe(t) for t in templates]), dtype=np.float32)
+
+    def describe(self, template):
+        """Return the L2-normalised HOG descriptor of a normalized template"""
+        descriptor = hog_descriptor(template)
+        norm = np.linalg.norm(descriptor)
+        return descriptor / norm if norm else descriptor
+
+    def rank(self, gray_image, top_k=5):
+        """Return up to ``top_k`` (emoji, similarity) pairs closest to a drawing"""
+        if not self.available or gray_image is None:
+            return []
+        template = normalize_glyph(gray_image, self.size)
+        if template is None:
+            return []
+
+        scores = self.descriptors @ self.describe(template)
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(self.emoji_list[i], float(scores[i])) for i in best]